@@ -3,9 +3,21 @@
 # Add imports here
 import os
 from .build_cleavage_probs import *
+from .confidence_bands import *
+from .damage_channels import *
 from .fragment_lengths import *
+from .footprints import *
+from .fragment_set import *
+from .importance_sampling import *
+from .nucleosome_ensemble import *
 from .params import *
+from .partials import *
+from .periodicity import *
 from .plot import *
+from .profiles import *
+from .scoring import *
+from .service import *
+from .writer import *
 
 from ._version import __version__
 
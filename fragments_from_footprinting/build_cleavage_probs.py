@@ -2,6 +2,8 @@
 Includes functions that create and save the numpy array of cleavage probabilities by nucleotide position.
 """
 from .params import *
+from .profiles import nucleosome_profile
+from .writer import save_array
 import numpy as np
 
 
@@ -13,7 +15,7 @@ def make_dyad_array(dyad_prob: float = 1.0, nuc_prob: float = 0.0, wrap_bp: int
     ----------
     dyad_prob : float
         Maximim probability of dyad cleavage
-    nuc_prob : float or np.ndarray
+    nuc_prob : float
         default: 0% chance of cleavage at nucleosome (0.0)
     dyad_width : int 
         number of nucleotides in the dyad 
@@ -21,17 +23,11 @@ def make_dyad_array(dyad_prob: float = 1.0, nuc_prob: float = 0.0, wrap_bp: int
         default: set in params.py
         Number of base pairs wrapped around the nucleosome.
     """
-    nuc_prob_arr = np.repeat(nuc_prob, wrap)
-    # print("Dyad Probability: "+str(dyad_prob), flush=True)
-    # np.linspace(... dyad_prob-nuc_prob,...) subtract nuc prob because you later add the dyad_diff to nuc_prob_arr
-    gradient = np.linspace(0, dyad_prob-nuc_prob, int(1+np.round(dyad_width/2)))[1:]
-    num_zeros_to_add = (wrap-2*len(gradient)+1)/2
-    zeros_to_add = np.zeros(int(num_zeros_to_add))
-    dyad_diff = np.concatenate((zeros_to_add,gradient,np.flip(gradient)[1:],zeros_to_add))
-    nuc_prob_arr_dyad = nuc_prob_arr + dyad_diff
-    return nuc_prob_arr_dyad
+    # The profile is memoized (see profiles.py); return a copy the caller may modify
+    return np.array(nucleosome_profile("dyad", nuc_prob = float(nuc_prob), peak_prob = float(dyad_prob),
+                                       dyad_width = int(dyad_width), wrap_bp = int(wrap_bp)))
 
-def generate_cleav_prob(link_prob: float = 1.0, nuc_prob: float = 0.0, linker_length: int = link_len, wrap_bp: int = wrap, dyad_bool = dyad_bool, dyad_width: int = dyad_width) -> np.ndarray:
+def generate_cleav_prob(link_prob: float = 1.0, nuc_prob: float = 0.0, linker_length: int = link_len, wrap_bp: int = wrap, dyad_bool = dyad_bool, dyad_width: int = dyad_width, num_nucs: int = num_nucs, circular: bool = False, save_data = 1, writer = None) -> np.ndarray:
 
     """
     Generate an array where each item is the cleavage probability of the corresponding base pair.
@@ -48,6 +44,19 @@ def generate_cleav_prob(link_prob: float = 1.0, nuc_prob: float = 0.0, linker_le
     wrap_bp : int
         default: set in params.py
         Number of base pairs wrapped around the nucleosome.
+    num_nucs : int
+        default: set in params.py
+        Number of nucleosomes in the fiber.
+    circular : bool
+        default: False
+        If True, leave out the leading linker so the array is a periodic unit cell of `num_nucs` repeats
+        (nucleosome followed by linker) for use with `simulate_fragment_set(circular=True)`. Choose `num_nucs`
+        so that the cell is longer than `max_fragment_length`.
+    save_data : bool
+        Boolean indicating whether or not to save the array as intermed_data/cleavage_prob.npy.
+    writer : AsyncWriter
+        default: None
+        If given, the array is saved in the background by this writer.
     Returns
     -------
     cleavage_prob : np.ndarray
@@ -78,18 +87,19 @@ def generate_cleav_prob(link_prob: float = 1.0, nuc_prob: float = 0.0, linker_le
 
     
     # Pass an error if the probability array is the wrong size        
-    if len(nuc_prob_arr) != wrap:    
+    if len(nuc_prob_arr) != wrap_bp:
         raise ValueError('Error: nuc_prob_arr not correct length')
 
     
     #Iterate through num_nucs times to build complete cleavage array
-    cleavage_prob = linker_cleavage_prob_arr
+    cleavage_prob = np.array([]) if circular else linker_cleavage_prob_arr
     for i in range(0,num_nucs):
         cleavage_prob = np.concatenate((cleavage_prob,nuc_prob_arr))
         cleavage_prob = np.concatenate((cleavage_prob,linker_cleavage_prob_arr))
     #convert from list to array
     cleavage_prob = np.array(cleavage_prob)
-    np.save('intermed_data/cleavage_prob.npy', cleavage_prob)
+    if save_data:
+        save_array('intermed_data/cleavage_prob.npy', cleavage_prob, writer)
     return cleavage_prob
 
 if __name__ == "__main__":
@@ -0,0 +1,275 @@
+"""
+Bootstrap and jackknife confidence bands for the fragment length distribution and v-plot.
+
+Trials are grouped into blocks and one histogram is kept per block, so resampling only
+needs the block counts and never re-runs the simulation.
+"""
+from .params import max_fragment_length, distance_from_frag_center
+from statistics import NormalDist
+import numpy as np
+
+
+def _block_of_trial(trial_ids: np.ndarray, num_trials: int, num_blocks: int):
+    """
+    Assign each trial to one of `num_blocks` contiguous, equally sized groups of trials.
+    """
+    if num_blocks > num_trials:
+        raise ValueError("num_blocks must not be larger than the number of trials")
+    return trial_ids.astype(np.int64) * num_blocks // num_trials
+
+
+def block_flds(fragment_set, num_blocks: int = 20, max_frag: int = max_fragment_length, bin_lens: int = 1):
+    """
+    Fragment length histogram for each block of trials.
+
+    Parameters
+    ----------
+    fragment_set : FragmentSet
+        Fragments and the trials that produced them.
+
+    num_blocks : int
+        Number of trial blocks. Each block holds about `num_trials / num_blocks` trials.
+
+    max_frag : int
+        default: set in params.py
+        Largest fragment length to consider (exclusive).
+
+    bin_lens : int, default = 1
+        Width of the fragment length bins.
+
+    Returns
+    -------
+    block_counts : np.ndarray
+        (num_blocks, fragment length bins) array of counts. Summing over axis 0 gives `fragment_set.to_fld()`.
+    """
+    fragment_set._check_period(max_frag)
+    short = fragment_set.shorter_than(max_frag)
+    num_len_bins = int(max_frag / bin_lens)
+    len_bin = short.frag_lens.astype(np.int64) // bin_lens
+    keep = len_bin < num_len_bins
+    blocks = _block_of_trial(short.trial_ids[keep], fragment_set.num_trials, num_blocks)
+    flat = blocks * num_len_bins + len_bin[keep]
+    weights = None if short.weights is None else short.weights[keep]
+    return np.bincount(flat, weights=weights, minlength=num_blocks * num_len_bins).reshape(num_blocks, num_len_bins)
+
+
+def block_vplots(fragment_set, num_blocks: int = 20, max_frag: int = max_fragment_length,
+                 dist_from_center: int = distance_from_frag_center, bin_lens: int = 1, bin_locs: int = 10):
+    """
+    V-plot array for each block of trials.
+
+    Parameters
+    ----------
+    fragment_set : FragmentSet
+        Fragments and the trials that produced them.
+
+    num_blocks : int
+        Number of trial blocks.
+
+    max_frag, dist_from_center, bin_lens, bin_locs :
+        Binning, as in `FragmentSet.to_vplot`.
+
+    Returns
+    -------
+    block_counts : np.ndarray
+        (num_blocks, midpoint bins, fragment length bins) array of counts. Summing over axis 0 gives `fragment_set.to_vplot()`.
+    """
+    selected, bin_idx, shape = fragment_set.vplot_bin_index(max_frag, dist_from_center, bin_lens, bin_locs)
+    short = fragment_set.shorter_than(max_frag)
+    blocks = _block_of_trial(short.trial_ids[selected], fragment_set.num_trials, num_blocks)
+    weights = None if short.weights is None else short.weights[selected]
+    num_bins = shape[0] * shape[1]
+    counts = np.bincount(blocks * num_bins + bin_idx, weights=weights, minlength=num_blocks * num_bins)
+    return counts.reshape((num_blocks,) + shape)
+
+
+def _normalize(counts: np.ndarray):
+    """
+    Divide each row by its total (rows with no counts are left at zero).
+    """
+    totals = counts.sum(axis=-1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0)
+
+
+def bootstrap_bands(block_counts: np.ndarray, num_resamples: int = 1000, ci: float = 0.95, normalize: bool = True,
+                    seed=None, max_values: int = 1 << 22):
+    """
+    Percentile bootstrap confidence band from per-block histograms.
+
+    Blocks are resampled with replacement by drawing multinomial block weights, so each
+    resample is a single matrix product of the weights with the block counts.
+
+    Parameters
+    ----------
+    block_counts : np.ndarray
+        (num_blocks, ...) array of histograms, e.g. from `block_flds` or `block_vplots`.
+
+    num_resamples : int
+        Number of bootstrap resamples.
+
+    ci : float
+        Coverage of the confidence band.
+
+    normalize : bool
+        If True, each resample is normalized to sum to 1 (i.e. the band is on probabilities, as in `plot_fld`).
+
+    seed : int, default None
+        Seed for numpy's random generator.
+
+    max_values : int
+        Memory budget: at most this many resampled values (8 bytes each, about 32 MB by default) are held at once.
+        Bins are resampled in chunks of `max_values // num_resamples`; `np.quantile` makes one more copy of each chunk.
+
+    Returns
+    -------
+    estimate : np.ndarray
+        Histogram of all blocks combined (normalized if `normalize`).
+
+    lower : np.ndarray
+        Lower edge of the confidence band.
+
+    upper : np.ndarray
+        Upper edge of the confidence band.
+    """
+    rng = np.random.default_rng(seed)
+    num_blocks = block_counts.shape[0]
+    flat = block_counts.reshape(num_blocks, -1).astype(float)
+    weights = rng.multinomial(num_blocks, np.full(num_blocks, 1. / num_blocks), size=num_resamples).astype(float)
+    # Totals of every resample are needed before normalizing each chunk of bins
+    totals = weights @ flat.sum(axis=1) if normalize else np.ones(num_resamples)
+    totals[totals == 0] = np.inf
+    alpha = (1. - ci) / 2.
+    chunk_size = max(1, max_values // num_resamples)
+    lower = np.empty(flat.shape[1])
+    upper = np.empty(flat.shape[1])
+    for start in range(0, flat.shape[1], chunk_size):
+        resampled = (weights @ flat[:, start:start + chunk_size]) / totals[:, None]
+        lower[start:start + chunk_size], upper[start:start + chunk_size] = np.quantile(resampled, [alpha, 1. - alpha], axis=0)
+    estimate = flat.sum(axis=0)
+    if normalize:
+        estimate = _normalize(estimate)
+    shape = block_counts.shape[1:]
+    return estimate.reshape(shape), lower.reshape(shape), upper.reshape(shape)
+
+
+def jackknife_bands(block_counts: np.ndarray, ci: float = 0.95, normalize: bool = True):
+    """
+    Normal-approximation confidence band from delete-one-block jackknife standard errors.
+
+    Parameters
+    ----------
+    block_counts : np.ndarray
+        (num_blocks, ...) array of histograms, e.g. from `block_flds` or `block_vplots`.
+
+    ci : float
+        Coverage of the confidence band.
+
+    normalize : bool
+        If True, histograms are normalized to sum to 1.
+
+    Returns
+    -------
+    estimate : np.ndarray
+        Histogram of all blocks combined (normalized if `normalize`).
+
+    lower : np.ndarray
+        Lower edge of the confidence band.
+
+    upper : np.ndarray
+        Upper edge of the confidence band.
+    """
+    num_blocks = block_counts.shape[0]
+    if num_blocks < 2:
+        raise ValueError("jackknife requires at least 2 blocks")
+    flat = block_counts.reshape(num_blocks, -1).astype(float)
+    total = flat.sum(axis=0)
+    # Leave-one-block-out histograms, scaled to the full number of blocks
+    leave_one_out = (total - flat) * num_blocks / (num_blocks - 1.)
+    if normalize:
+        leave_one_out = _normalize(leave_one_out)
+        total = _normalize(total)
+    std_err = np.sqrt((num_blocks - 1.) / num_blocks * np.sum((leave_one_out - leave_one_out.mean(axis=0)) ** 2, axis=0))
+    z = NormalDist().inv_cdf(1. - (1. - ci) / 2.)
+    shape = block_counts.shape[1:]
+    return total.reshape(shape), (total - z * std_err).reshape(shape), (total + z * std_err).reshape(shape)
+
+
+def _bands(block_counts: np.ndarray, method: str, ci: float, seed):
+    if method == "bootstrap":
+        return bootstrap_bands(block_counts, ci=ci, seed=seed)
+    elif method == "jackknife":
+        return jackknife_bands(block_counts, ci=ci)
+    else:
+        raise ValueError("method must be 'bootstrap' or 'jackknife'")
+
+
+def fld_confidence_bands(fragment_set, method: str = "bootstrap", num_blocks: int = 20, max_frag: int = max_fragment_length,
+                         bin_lens: int = 10, ci: float = 0.95, seed=None):
+    """
+    Confidence band for the fragment length distribution (as probabilities per bin).
+
+    Parameters
+    ----------
+    fragment_set : FragmentSet
+        Fragments and the trials that produced them.
+
+    method : str
+        'bootstrap' or 'jackknife'.
+
+    num_blocks : int
+        Number of trial blocks to resample.
+
+    max_frag : int
+        default: set in params.py
+        Largest fragment length to consider (exclusive).
+
+    bin_lens : int, default = 10
+        Width of the fragment length bins. The default matches the binning used by `plot_fld`.
+
+    ci : float
+        Coverage of the confidence band.
+
+    seed : int, default None
+        Seed for the bootstrap resampling.
+
+    Returns
+    -------
+    bands : tuple of np.ndarray
+        (estimate, lower, upper), which can be passed to `plot_fld`.
+    """
+    return _bands(block_flds(fragment_set, num_blocks, max_frag, bin_lens), method, ci, seed)
+
+
+def vplot_confidence_bands(fragment_set, method: str = "bootstrap", num_blocks: int = 20, max_frag: int = max_fragment_length,
+                           dist_from_center: int = distance_from_frag_center, bin_lens: int = 1, bin_locs: int = 10,
+                           ci: float = 0.95, seed=None):
+    """
+    Confidence band for the v-plot (as probabilities per bin).
+
+    Parameters
+    ----------
+    fragment_set : FragmentSet
+        Fragments and the trials that produced them.
+
+    method : str
+        'bootstrap' or 'jackknife'.
+
+    num_blocks : int
+        Number of trial blocks to resample.
+
+    max_frag, dist_from_center, bin_lens, bin_locs :
+        Binning, as in `FragmentSet.to_vplot`.
+
+    ci : float
+        Coverage of the confidence band.
+
+    seed : int, default None
+        Seed for the bootstrap resampling.
+
+    Returns
+    -------
+    bands : tuple of np.ndarray
+        (estimate, lower, upper), each shaped like the v-plot array; can be passed to `plot_vplot`.
+    """
+    block_counts = block_vplots(fragment_set, num_blocks, max_frag, dist_from_center, bin_lens, bin_locs)
+    return _bands(block_counts, method, ci, seed)
@@ -0,0 +1,147 @@
+"""
+Multi-channel damage model built from the solvent accessible surface area (SASA) of the atoms hit by radiation.
+
+The bundled 1kx5 SASA files give, for each strand (I and J) and each damage-relevant atom site
+(C5', O1P, O2P, O5' and the phosphate), the accessibility of every wrapped nucleotide. Each
+(strand, site) pair is a damage channel with its own cleavage probability along the fiber.
+`simulate_fragment_set(channel_probs=...)` assigns every break to a channel, so per-channel
+FLDs and v-plots come from a single simulation.
+"""
+from .params import max_fragment_length, distance_from_frag_center, link_len, wrap, num_nucs
+from .build_cleavage_probs import generate_cleav_prob
+import os
+import numpy as np
+
+SASA_SITES = ("ic5p", "iop1", "iop2", "iop5p", "iphos")
+SASA_STRANDS = ("I", "J")
+SASA_DIR = os.path.join(os.path.dirname(__file__), "data", "1kx5_solv_access_surf_area")
+
+
+def load_sasa(site: str, strand: str = "I", wrap_bp: int = wrap):
+    """
+    Solvent accessible surface area of one atom site along one strand of the nucleosome.
+
+    Parameters
+    ----------
+    site : str
+        One of `SASA_SITES`.
+
+    strand : str
+        'I' or 'J'. Strand J runs antiparallel to strand I and is reversed so that both are indexed
+        in the same direction along the wrapped DNA.
+
+    wrap_bp : int
+        default: set in params.py
+        Number of base pairs wrapped around the nucleosome. The 146-147 values in the file are
+        padded with zeros (or truncated) at the end to this length.
+
+    Returns
+    -------
+    sasa : np.ndarray
+        SASA in square angstroms of each wrapped nucleotide.
+    """
+    if site not in SASA_SITES or strand not in SASA_STRANDS:
+        raise ValueError("unknown SASA channel: " + strand + "_" + site)
+    with open(os.path.join(SASA_DIR, "1kx5_" + strand + "_" + site + ".txt")) as f:
+        sasa = np.array([float(value) for value in f.read().strip().strip("[]").split(",") if value.strip()])
+    if strand == "J":
+        sasa = sasa[::-1]
+    return np.pad(sasa, (0, max(wrap_bp - len(sasa), 0)))[:wrap_bp]
+
+
+def sasa_channel_probs(channels: list = None, link_prob: float = 1.0, linker_length: int = link_len, wrap_bp: int = wrap,
+                       num_nucs: int = num_nucs, circular: bool = False):
+    """
+    Cleavage probability of each damage channel at every nucleotide position.
+
+    A channel's accessibility in the linker is taken to be its largest SASA on the nucleosome
+    (fully exposed DNA), and on the nucleosome its SASA at that position. Accessibilities are
+    divided by the sum over channels of the linker accessibilities, so the channels add up to
+    `link_prob` in the linker and to less on the nucleosome.
+
+    Parameters
+    ----------
+    channels : list of str, default None
+        Channels as 'strand_site', e.g. ['I_iop1', 'J_iop1']. Defaults to every strand and site.
+
+    link_prob : float
+        default: 100% chance of cleavage at linker (1.0)
+
+    linker_length, wrap_bp, num_nucs, circular :
+        Fiber geometry, as in `generate_cleav_prob`.
+
+    Returns
+    -------
+    channels : list of str
+        Channel names, in the order of the rows of `channel_probs`.
+
+    channel_probs : np.ndarray
+        (channels, nts) cleavage probabilities. Their sum over channels is the overall `cleavage_prob`.
+    """
+    if channels is None:
+        channels = [strand + "_" + site for strand in SASA_STRANDS for site in SASA_SITES]
+    sasa = np.array([load_sasa(channel.split("_")[1], channel.split("_")[0], wrap_bp) for channel in channels])
+    exposed = sasa.max(axis=1)
+    scale = link_prob / np.sum(exposed)
+    channel_probs = np.array([generate_cleav_prob(link_prob = scale * exposed[c], nuc_prob = scale * sasa[c],
+                                                  linker_length = linker_length, wrap_bp = wrap_bp, dyad_bool = 0,
+                                                  num_nucs = num_nucs, circular = circular, save_data = 0)
+                              for c in range(len(channels))])
+    return list(channels), channel_probs
+
+
+def channel_flds(fragment_set, num_channels: int, max_frag: int = max_fragment_length, bin_lens: int = 1):
+    """
+    FLD of the fragment ends produced by each damage channel.
+
+    Each fragment is counted once for the channel of each of its two ends, so the sum over
+    channels is twice the FLD of the fragment set.
+
+    Parameters
+    ----------
+    fragment_set : FragmentSet
+        Fragments with `end_channels`, from `simulate_fragment_set(channel_probs=...)`.
+
+    num_channels : int
+        Number of channels simulated.
+
+    max_frag, bin_lens :
+        Binning, as in `FragmentSet.to_fld`.
+
+    Returns
+    -------
+    flds : np.ndarray
+        (channels, fragment length bins) counts.
+    """
+    if fragment_set.end_channels is None:
+        raise ValueError("fragment_set has no damage channels")
+    fragment_set._check_period(max_frag)
+    short = fragment_set.shorter_than(max_frag)
+    num_len_bins = int(max_frag / bin_lens)
+    len_bin = short.frag_lens.astype(np.int64) // bin_lens
+    weights = None if short.weights is None else np.tile(short.weights, 2)
+    bin_idx = short.end_channels.T.astype(np.int64) * num_len_bins + len_bin
+    return np.bincount(bin_idx.ravel(), weights=weights, minlength=num_channels * num_len_bins).reshape(num_channels, num_len_bins)
+
+
+def channel_vplots(fragment_set, num_channels: int, max_frag: int = max_fragment_length,
+                   dist_from_center: int = distance_from_frag_center, bin_lens: int = 1, bin_locs: int = 10):
+    """
+    V-plot of the fragment ends produced by each damage channel.
+
+    As in `channel_flds`, each fragment is counted once for the channel of each of its ends.
+
+    Returns
+    -------
+    vplots : np.ndarray
+        (channels, midpoint bins, fragment length bins) counts, each binned as in `FragmentSet.to_vplot`.
+    """
+    if fragment_set.end_channels is None:
+        raise ValueError("fragment_set has no damage channels")
+    selected, bin_idx, shape = fragment_set.vplot_bin_index(max_frag, dist_from_center, bin_lens, bin_locs)
+    short = fragment_set.shorter_than(max_frag)
+    num_bins = shape[0] * shape[1]
+    weights = None if short.weights is None else np.tile(short.weights[selected], 2)
+    channel_idx = short.end_channels[selected].T.astype(np.int64) * num_bins + bin_idx
+    vplots = np.bincount(channel_idx.ravel(), weights=weights, minlength=num_channels * num_bins)
+    return vplots.reshape((num_channels,) + shape).astype(float)
@@ -0,0 +1,226 @@
+"""
+Build cleavage probability arrays from arbitrary, possibly overlapping, protein footprints.
+
+Each footprint is an interval (start, end) with a protection profile (1 = fully protected,
+0 = unprotected) and an occupancy (fraction of fibers on which it is bound). This covers
+nucleosomes, transcription factors, linker histones, remodelers, ... at any coordinates.
+Uniform footprints are processed together with a sweep line, profiled footprints in batches
+that are binned over their own span, never one feature at a time.
+"""
+from .params import num_nucs, link_len, wrap
+from .writer import save_array
+import numpy as np
+
+
+def nucleosome_intervals(num_nucs: int = num_nucs, linker_length: int = link_len, wrap_bp: int = wrap):
+    """
+    Start and end of every nucleosome of the regular fiber built by `generate_cleav_prob`.
+
+    Returns
+    -------
+    starts : np.ndarray
+        First nucleotide covered by each nucleosome.
+
+    ends : np.ndarray
+        One past the last nucleotide covered by each nucleosome.
+    """
+    starts = linker_length + np.arange(num_nucs) * (linker_length + wrap_bp)
+    return starts, starts + wrap_bp
+
+
+def _profiled_batches(starts: np.ndarray, profile_ids: np.ndarray, profile_lens: np.ndarray, chunk_size: int):
+    """
+    Groups of footprints sharing a profile, sorted by start and covering at most about `chunk_size` positions.
+
+    Yields
+    ------
+    profile_id : int
+        Profile of the footprints in the group.
+
+    batch : np.ndarray
+        Indices of the footprints in the group.
+    """
+    for profile_id in np.unique(profile_ids):
+        members = np.flatnonzero(profile_ids == profile_id)
+        members = members[np.argsort(starts[members], kind="stable")]
+        per_batch = max(chunk_size // max(profile_lens[profile_id], 1), 1)
+        for first in range(0, len(members), per_batch):
+            yield profile_id, members[first:first + per_batch]
+
+
+def _sweep_sum(length: int, lo: np.ndarray, hi: np.ndarray, values, dtype=float):
+    """
+    Sum of `values` over the intervals [lo, hi) covering each position, from one difference array.
+    """
+    diff = np.zeros(length + 1, dtype=dtype)
+    np.add.at(diff, lo, values)
+    np.subtract.at(diff, hi, values)
+    np.cumsum(diff, out=diff)
+    return diff[:length]
+
+
+def _max_at(out: np.ndarray, pos: np.ndarray, values: np.ndarray):
+    """
+    out[pos] = max(out[pos], values), with repeated positions reduced by a sort and `np.maximum.reduceat`.
+    """
+    if len(pos) == 0:
+        return
+    order = np.argsort(pos)
+    pos, values = pos[order], values[order]
+    first = np.flatnonzero(np.concatenate([[True], pos[1:] != pos[:-1]]))
+    out[pos[first]] = np.maximum(out[pos[first]], np.maximum.reduceat(values, first))
+
+
+def _sweep_max(length: int, lo: np.ndarray, hi: np.ndarray, values: np.ndarray):
+    """
+    Largest of `values` over the intervals [lo, hi) covering each position (0 where none).
+
+    Each interval is covered by two, possibly overlapping, blocks of length 2**k with k = floor(log2(hi - lo)).
+    Going down from the longest blocks, the running maximum of the blocks of length 2**(k+1) starting at each
+    position is split into the two blocks of length 2**k it consists of, so the work is one pass over the
+    array per level instead of one write per covered position.
+    """
+    max_value = np.zeros(length)
+    keep = hi > lo
+    lo, hi, values = lo[keep], hi[keep], values[keep]
+    if len(lo) == 0:
+        return max_value
+    level = np.frexp((hi - lo).astype(float))[1] - 1
+    for k in range(int(level.max()), -1, -1):
+        block = 1 << k
+        np.maximum(max_value[block:], max_value[:-block], out=max_value[block:])
+        at = level == k
+        _max_at(max_value, np.concatenate([lo[at], hi[at] - block]), np.tile(values[at], 2))
+    return max_value
+
+
+def _profile_max(starts: np.ndarray, occupancy: np.ndarray, profile: np.ndarray, span: int):
+    """
+    Largest `occupancy * profile` at each of `span` positions over footprints with sorted `starts` (relative to the span).
+
+    Every position of the profile is written for all footprints at once. Footprints sharing a start are
+    written in separate passes, so that no position is written twice by the same assignment.
+    """
+    max_value = np.zeros(span)
+    first = np.flatnonzero(np.concatenate([[True], starts[1:] != starts[:-1]]))
+    rank = np.arange(len(starts)) - np.repeat(first, np.diff(np.append(first, len(starts))))
+    for layer in range(int(rank.max()) + 1 if len(rank) else 0):
+        in_layer = rank == layer
+        layer_starts = starts[in_layer]
+        protection = profile[:, None] * occupancy[in_layer]
+        for offset, column in enumerate(protection):
+            pos = layer_starts + offset
+            max_value[pos] = np.maximum(max_value.take(pos), column)
+    return max_value
+
+
+def compose_footprints(length: int, starts: np.ndarray, ends: np.ndarray, profiles: list, profile_ids: np.ndarray = None,
+                       occupancy: np.ndarray = 1.0, base_prob: float = 1.0, rule: str = "max", chunk_size: int = 1 << 19,
+                       save_data = 0, writer = None) -> np.ndarray:
+    """
+    Generate an array of cleavage probabilities from a set of footprints.
+
+    Parameters
+    ----------
+    length : int
+        Number of nucleotides in the array.
+
+    starts, ends : np.ndarray
+        First nucleotide and one past the last nucleotide of each footprint. Parts outside [0, length) are ignored.
+
+    profiles : list of float or np.ndarray
+        Library of protection profiles (values in [0, 1]). A scalar (or length-1 array) protects the whole
+        interval uniformly; an array must have the same length as every interval that uses it.
+
+    profile_ids : np.ndarray, default None
+        Index into `profiles` for each footprint. Defaults to 0 for every footprint.
+
+    occupancy : float or np.ndarray
+        Fraction of fibers on which each footprint is bound. The expected protection is `occupancy * profile`.
+
+    base_prob : float
+        Cleavage probability of unprotected DNA.
+
+    rule : str
+        How overlapping footprints combine:
+        'max' - the strongest protection wins, cleavage = base_prob * (1 - max_i protection_i);
+        'multiply' - footprints protect independently, cleavage = base_prob * prod_i (1 - protection_i).
+
+    chunk_size : int
+        Number of positions written at once for profiled footprints. Bounds memory use.
+
+    save_data : bool
+        Boolean indicating whether or not to save the array as intermed_data/cleavage_prob.npy.
+
+    writer : AsyncWriter, default None
+        If given, the array is saved in the background by this writer.
+
+    Returns
+    -------
+    cleavage_prob : np.ndarray
+        Probability of cleavage corresponding to each nucleotide position.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    num_features = len(starts)
+    profile_ids = np.zeros(num_features, dtype=np.int64) if profile_ids is None else np.asarray(profile_ids, dtype=np.int64)
+    occupancy = np.broadcast_to(np.asarray(occupancy, dtype=float), (num_features,))
+    if rule not in ("max", "multiply"):
+        raise ValueError("rule must be 'max' or 'multiply'")
+
+    # Flatten the profile library once; scalar profiles are read at offset 0 for every position
+    profiles = [np.atleast_1d(np.asarray(profile, dtype=float)) for profile in profiles]
+    profile_lens = np.array([len(profile) for profile in profiles])
+    profile_offsets = np.cumsum(profile_lens) - profile_lens
+    flat_profiles = np.concatenate(profiles)
+    is_constant = profile_lens[profile_ids] == 1
+    if np.any(~is_constant & (ends - starts != profile_lens[profile_ids])):
+        raise ValueError("interval length does not match the length of its protection profile")
+
+    # Uniform footprints: sweep line over the intervals
+    protection = occupancy[is_constant] * flat_profiles[profile_offsets[profile_ids[is_constant]]]
+    lo = np.clip(starts[is_constant], 0, length)
+    hi = np.clip(ends[is_constant], 0, length)
+    if rule == "multiply":
+        # Sum log(1 - protection), and count fully protecting footprints separately
+        full = protection >= 1.
+        with np.errstate(divide="ignore"):
+            factor = np.where(full, 0., np.log1p(-np.minimum(protection, 1.)))
+        log_free = _sweep_sum(length, lo, hi, factor)
+        blocked = _sweep_sum(length, lo[full], hi[full], 1, dtype=np.int32)
+    else:
+        max_protection = _sweep_max(length, lo, hi, protection)
+
+    # Profiled footprints: batches of nearby footprints sharing a profile, each binned over its own span only
+    profiled = np.flatnonzero(~is_constant)
+    for profile_id, batch in _profiled_batches(starts[profiled], profile_ids[profiled], profile_lens, chunk_size):
+        batch = profiled[batch]
+        profile = profiles[profile_id]
+        offset = starts[batch[0]]
+        span = starts[batch[-1]] + len(profile) - offset
+        lo, hi = max(offset, 0), min(offset + span, length)
+        if lo >= hi:
+            continue
+        if rule == "multiply":
+            pos = (starts[batch, None] - offset + np.arange(len(profile))).ravel()
+            protection = (occupancy[batch, None] * profile).ravel()
+            full = protection >= 1.
+            if np.any(full):
+                blocked[lo:hi] += np.bincount(pos[full], minlength=span)[lo - offset:hi - offset]
+                protection[full] = 0.
+            log_free[lo:hi] += np.bincount(pos, weights=np.log1p(-protection), minlength=span)[lo - offset:hi - offset]
+        else:
+            batch_max = _profile_max(starts[batch] - offset, occupancy[batch], profile, span)
+            np.maximum(max_protection[lo:hi], batch_max[lo - offset:hi - offset], out=max_protection[lo:hi])
+
+    if rule == "multiply":
+        cleavage_prob = np.exp(log_free, out=log_free)
+        cleavage_prob *= base_prob
+        cleavage_prob[blocked > 0] = 0.
+    else:
+        cleavage_prob = np.minimum(max_protection, 1., out=max_protection)
+        np.subtract(1., cleavage_prob, out=cleavage_prob)
+        cleavage_prob *= base_prob
+    if save_data:
+        save_array('intermed_data/cleavage_prob.npy', cleavage_prob, writer)
+    return cleavage_prob
@@ -1,7 +1,11 @@
 """
 Run simulations to determine resulting fragment length distributions
 """
-from .params import max_fragment_length, distance_from_frag_center, fiber_midpoint, break_rate, num_trials
+from .params import max_fragment_length, distance_from_frag_center, fiber_midpoint, break_rate, num_trials, link_len, nrl
+from .fragment_set import FragmentSet
+from .nucleosome_ensemble import ensemble_cleavage_at, ensemble_mean_cleavage_prob
+from .importance_sampling import likelihood_ratio_tables, fragment_weights
+from .writer import save_array, save_csv
 import numpy as np
 import random
 import pandas as pd
@@ -85,7 +89,7 @@ def get_frag_lens(pot_cut_locs, cut_bool):
     return fragments, midpoints
 
 
-def get_fld(cleavage_prob: np.ndarray, trials: int = num_trials, break_rate: int = break_rate, xmin: int = 0, save_data = 1): # changed xmin from 50
+def get_fld(cleavage_prob: np.ndarray, trials: int = num_trials, break_rate: int = break_rate, xmin: int = 0, save_data = 1, writer = None): # changed xmin from 50
     """
     Generates fragment length distribution
 
@@ -103,6 +107,12 @@ def get_fld(cleavage_prob: np.ndarray, trials: int = num_trials, break_rate: int
     xmin : int
         Minimum fragment length to consider. Previously set default to 50nt to compare to RICC-seq simulated data.
 
+    save_data : bool
+        Boolean indicating whether or not to save the fragment lengths and midpoints.
+
+    writer : AsyncWriter, default None
+        If given, the arrays are saved in the background by this writer.
+
     Returns
     -------
     frag_lens_all_trials : np.ndarray
@@ -142,11 +152,476 @@ def get_fld(cleavage_prob: np.ndarray, trials: int = num_trials, break_rate: int
     # subset to same indices as frag_lens_all_trials
     midpts_all_trials = midpts_all_trials[idxs]
     if save_data:
-        np.save('intermed_data/frag_lens.npy', frag_lens_all_trials)
-        np.save('intermed_data/frag_midpts.npy', midpts_all_trials) 
+        save_array('intermed_data/frag_lens.npy', frag_lens_all_trials, writer)
+        save_array('intermed_data/frag_midpts.npy', midpts_all_trials, writer)
     return frag_lens_all_trials, midpts_all_trials
 
-def frag_mid_df(frag_lens: np.ndarray, midpts: np.ndarray):
+def _fragments_from_attempts(locs: np.ndarray, uniforms: np.ndarray, probs: np.ndarray, nts: int, first_trial: int = 0,
+                             circular: bool = False, return_starts: bool = False, labels: np.ndarray = None):
+    """
+    Vectorized equivalent of `get_frag_lens` for a block of trials.
+
+    Parameters
+    ----------
+    locs : np.ndarray
+        (trials, breaks) array of nucleotide positions on which to attempt breaks.
+
+    uniforms : np.ndarray
+        (trials, breaks) array of uniform [0,1) draws. A break is successful if the draw is < its probability.
+
+    probs : np.ndarray
+        (trials, breaks) array of cleavage probabilities at `locs`.
+
+    nts : int
+        Number of nucleotides in the simulated array.
+
+    first_trial : int
+        Trial ID of the first row of the block.
+
+    circular : bool
+        If True, the array is a circle and the last cut of each trial also delimits a fragment with its first cut.
+
+    return_starts : bool
+        If True, also return the position of the first cut of each fragment.
+
+    labels : np.ndarray, default None
+        (trials, breaks) array with a label (e.g. a damage channel) for each attempt. If given, also
+        return the labels of the cuts at both ends of each fragment.
+
+    Returns
+    -------
+    fragments : np.ndarray
+        Array of fragment lengths from the block of trials.
+
+    midpoints : np.ndarray
+        The center location of these fragments.
+
+    trial_ids : np.ndarray
+        Trial that produced each fragment.
+
+    starts : np.ndarray
+        Position of the first cut of each fragment (only if `return_starts`).
+
+    end_labels : np.ndarray
+        (fragments, 2) labels of the first and second cut of each fragment (only if `labels` is given).
+        Of several successful attempts at the same location, the first one's label is kept.
+    """
+    trial_idx, break_idx = np.nonzero(uniforms < probs)
+    # Encode (trial, location) in one integer; np.unique sorts and removes duplicate cuts at the same location
+    keys, first_attempt = np.unique(trial_idx.astype(np.int64) * nts + locs[trial_idx, break_idx], return_index=True)
+    trial = keys // nts
+    loc = keys - trial * nts
+    # Consecutive cuts within the same trial delimit a fragment
+    same_trial = trial[1:] == trial[:-1]
+    fragments = (loc[1:] - loc[:-1])[same_trial]
+    midpoints = np.round((loc[1:] + loc[:-1]) / 2.0)[same_trial].astype(np.int64)
+    trial_ids = trial[:-1][same_trial] + first_trial
+    starts = loc[:-1][same_trial]
+    if labels is not None:
+        cut_labels = labels[trial_idx[first_attempt], break_idx[first_attempt]]
+        end_labels = np.stack([cut_labels[:-1][same_trial], cut_labels[1:][same_trial]], axis=1)
+    if circular and len(keys):
+        # Fragment wrapping around from the last cut of each trial to its first cut
+        first = np.flatnonzero(np.append(True, ~same_trial))
+        last = np.append(first[1:] - 1, len(keys) - 1)
+        wrap_lens = loc[first] + nts - loc[last]
+        wrap_mids = np.round((loc[first] + nts + loc[last]) / 2.0).astype(np.int64) % nts
+        fragments = np.concatenate([fragments, wrap_lens])
+        midpoints = np.concatenate([midpoints, wrap_mids])
+        trial_ids = np.concatenate([trial_ids, trial[first] + first_trial])
+        starts = np.concatenate([starts, loc[last]])
+        if labels is not None:
+            end_labels = np.concatenate([end_labels, np.stack([cut_labels[last], cut_labels[first]], axis=1)])
+    result = (fragments, midpoints, trial_ids)
+    if return_starts:
+        result += (starts,)
+    if labels is not None:
+        result += (end_labels,)
+    return result
+
+
+def vplot_window(nts: int, max_frag: int = max_fragment_length, dist_from_center: int = distance_from_frag_center,
+                 midpoint: float = fiber_midpoint):
+    """
+    Region of the fiber that can produce fragments shown in the v-plot.
+
+    A fragment shorter than `max_frag` whose midpoint is within `dist_from_center` of `midpoint` lies
+    entirely within `dist_from_center + max_frag / 2` of `midpoint`; a margin of `max_frag` is used.
+
+    Returns
+    -------
+    window : tuple of int
+        (start, stop) nucleotide positions, clipped to the array.
+    """
+    start = max(int(np.floor(midpoint - dist_from_center - max_frag)), 0)
+    stop = min(int(np.ceil(midpoint + dist_from_center + max_frag)) + 1, nts)
+    return start, stop
+
+
+def _binomial_quantile(u: np.ndarray, n: int, p):
+    """
+    Smallest k with P(Binomial(n, p) <= k) > u, for each draw u (p may vary with u).
+    """
+    u = np.asarray(u, dtype=float)
+    p = np.broadcast_to(np.asarray(p, dtype=float), u.shape)
+    counts = np.empty(u.shape, dtype=np.int64)
+    k = np.arange(n)
+    for value in np.unique(p):
+        rows = p == value
+        if value <= 0 or value >= 1:
+            counts[rows] = 0 if value <= 0 else n
+            continue
+        # log pmf from the ratio of consecutive terms, so that large n neither overflows nor underflows
+        log_pmf = np.concatenate([[0.], np.cumsum(np.log(n - k) - np.log(k + 1) + np.log(value) - np.log1p(-value))])
+        cdf = np.cumsum(np.exp(log_pmf - log_pmf.max()))
+        counts[rows] = np.minimum(np.searchsorted(cdf, u[rows] * cdf[-1], side="right"), n)
+    return counts
+
+
+def _common_attempts(cleavage_prob: np.ndarray, count_uniforms: np.ndarray, location_uniforms: np.ndarray, breaks_to_try: int,
+                     trial_idx: np.ndarray = None, ensemble: tuple = None):
+    """
+    Successful breaks of a block of trials from common random numbers, as attempts for `_fragments_from_attempts`.
+
+    A trial's number of successful breaks is the `count_uniforms` quantile of Binomial(breaks_to_try, mean cleavage
+    probability), and its k-th break lies at the `location_uniforms[:, k]` quantile of the cleavage probability along
+    the fiber. This has the same distribution as `breaks_to_try` uniform attempts, but profiles given the same draws
+    keep the same number of breaks and move each break only as far as the probability mass in front of it has moved.
+
+    Returns
+    -------
+    locs, uniforms, probs : np.ndarray
+        (trials, breaks_to_try) arrays. A column is a break if its uniform is below its probability; the uniform
+        of a break is then uniform on [0, p(x)), as for a regular attempt, so it can also pick a damage channel.
+    """
+    location_uniforms = location_uniforms[:, :breaks_to_try]
+    nts = len(cleavage_prob)
+    if ensemble is None:
+        fiber = np.asarray(cleavage_prob, dtype=float)[None, :]
+    else:
+        present, shifts = ensemble
+        fiber = ensemble_cleavage_at(cleavage_prob, np.broadcast_to(np.arange(nts), (len(trial_idx), nts)), trial_idx[:, None],
+                                     present, shifts)
+    cumulative = np.cumsum(fiber, axis=1)
+    totals = cumulative[:, -1]
+    num_breaks = _binomial_quantile(count_uniforms, breaks_to_try, totals / nts)
+    targets = location_uniforms * totals[:, None]
+    if ensemble is None:
+        locs = np.searchsorted(cumulative[0], targets, side="right")
+    else:
+        locs = np.stack([np.searchsorted(row, target, side="right") for row, target in zip(cumulative, targets)])
+    locs = np.minimum(locs, nts - 1)
+    rows = np.zeros((1, 1), dtype=np.int64) if ensemble is None else np.arange(len(fiber))[:, None]
+    probs = fiber[rows, locs]
+    # Position of the target within the probability of its nucleotide
+    residual = np.clip(targets - (cumulative[rows, locs] - probs), 0., np.nextafter(probs, 0.))
+    is_break = np.arange(location_uniforms.shape[1]) < num_breaks[:, None]
+    return locs, np.where(is_break, residual, 1.), np.where(is_break, probs, 0.)
+
+
+def draw_common_random_numbers(cleavage_probs: list, trials: int = num_trials, break_rate: int = break_rate, seed=None):
+    """
+    Draw random numbers to be shared across cleavage profiles.
+
+    Passing the same draws to `simulate_fragment_set` for several cleavage profiles (common random
+    numbers) makes their outputs differ only where the profiles differ, so paired comparisons need
+    fewer trials than with independent draws. Each trial keeps the same number of breaks under every
+    profile and each break is placed by the quantile of the cleavage probability along the fiber, so
+    a break only moves as far as the profile change shifts the probability mass before it. The gain
+    is limited by the share of breaks that a change of profile has to move: for example about 15% of
+    breaks move onto nucleosomes when `nuc_prob` goes from 0 to 0.05.
+
+    Parameters
+    ----------
+    cleavage_probs : list of np.ndarray
+        Cleavage probability arrays that will be compared. They must all have the same length.
+
+    trials : int
+        Number of trials.
+
+    break_rate : int
+        1 break per this many nucleotides.
+
+    seed : int or np.random.SeedSequence, default None
+        Seed for numpy's random generator.
+
+    Returns
+    -------
+    common_random_numbers : tuple of np.ndarray
+        (count_uniforms, location_uniforms), of shapes (trials,) and (trials, breaks) where breaks is the
+        largest number of breaks to try over `cleavage_probs`.
+    """
+    nts = len(cleavage_probs[0])
+    if any(len(cp) != nts for cp in cleavage_probs):
+        raise ValueError("cleavage_probs must all have the same length")
+    max_breaks = max(get_breaks_to_try(cp, breaks_per_nt = 1./break_rate)[0] for cp in cleavage_probs)
+    rng = np.random.default_rng(seed)
+    count_uniforms = rng.random(trials)
+    location_uniforms = rng.random((trials, max_breaks))
+    return count_uniforms, location_uniforms
+
+
+def simulate_fragment_set(cleavage_prob: np.ndarray, trials: int = num_trials, break_rate: int = break_rate, xmin: int = 0,
+                          seed=None, block_size: int = 1000, common_random_numbers: tuple = None, ensemble: tuple = None,
+                          circular: bool = False, midpoint: float = None, window: tuple = None,
+                          proposal_break_rate: int = None, channel_probs: np.ndarray = None, save_data = 0, writer = None):
+    """
+    Vectorized version of `get_fld` that returns a `FragmentSet`.
+
+    Trials are simulated in blocks of `block_size` with numpy's random generator, and fragments are
+    kept as compact integer arrays together with the trial that produced them.
+
+    Parameters
+    ----------
+    cleavage_prob : np.ndarray
+        Probability of cleavage corresponding to each nucleotide position.
+
+    trials : int
+        Number of trials (i.e. number of times the given number of breaks are attempted on the simulated nucleotide array).
+        Ignored if `common_random_numbers` or `ensemble` is given.
+
+    break_rate : int
+        1 break per this many nucleotides.
+
+    xmin : int
+        Minimum fragment length to consider (exclusive).
+
+    seed : int or np.random.SeedSequence, default None
+        Seed for numpy's random generator.
+
+    block_size : int
+        Number of trials simulated at once. Bounds memory use to roughly `block_size * breaks_to_try` draws.
+
+    common_random_numbers : tuple of np.ndarray, default None
+        (count_uniforms, location_uniforms) from `draw_common_random_numbers`. If given, these draws are used
+        instead of fresh random numbers and the number of trials is taken from them. With an ensemble, each
+        block holds the full cleavage array of every trial, i.e. `block_size * nts` values.
+
+    ensemble : tuple of np.ndarray, default None
+        (present, shifts) from `sample_ensemble`. If given, `cleavage_prob` is treated as the template of a
+        regular fiber and each trial uses its own nucleosome occupancy and positions.
+
+    circular : bool
+        If True, `cleavage_prob` is a periodic unit cell (see `generate_cleav_prob(circular=True)`) and fragments
+        wrap around its ends, so there are no truncated fragments at the fiber ends. The cell must be longer than
+        the largest fragment length of interest (`max_frag`): a circle cannot produce longer fragments, and a trial
+        with a single cut produces one fragment exactly one cell long.
+
+    midpoint : float, default None
+        Reference position for relative midpoints. Defaults to `fiber_midpoint`, or for a circular unit cell to the
+        position with the same phase relative to the nucleosomes as `fiber_midpoint` has in the linear fiber.
+
+    window : tuple of int, default None
+        (start, stop) region to simulate, e.g. from `vplot_window`. Each trial attempts a binomially distributed
+        number of the `breaks_to_try` breaks inside the window, as in the full fiber, and only fragments with both
+        ends inside the window are produced. Fragments entirely inside the window (and so the v-plot) are
+        statistically identical to a full-fiber run; the FLD is restricted to the window.
+
+    proposal_break_rate : int, default None
+        If given, trials are run at this (lower) break rate and each fragment is weighted by its likelihood
+        ratio at `break_rate` (see `importance_sampling`). Use `weighted_fld` / `weighted_vplot` for
+        estimates with variances.
+
+    channel_probs : np.ndarray, default None
+        (channels, nts) cleavage probability of each damage channel, summing to `cleavage_prob` (see
+        `sasa_channel_probs`). If given, each successful break is assigned a channel with probability
+        proportional to the channel's probability at that position, and the fragment set records the
+        channel of both ends of every fragment (`end_channels`).
+
+    save_data : bool
+        Boolean indicating whether or not to save the fragment set.
+
+    writer : AsyncWriter, default None
+        If given, the fragment set is saved in the background by this writer.
+
+    Returns
+    -------
+    fragment_set : FragmentSet
+        Fragment lengths, midpoints and trial IDs from all trials.
+    """
+    rng = np.random.default_rng(seed)
+    nts = len(cleavage_prob)
+    breaks_to_try, exp_breaks = get_breaks_to_try(cleavage_prob, breaks_per_nt = 1./break_rate)
+    if proposal_break_rate is not None:
+        if circular or ensemble is not None or common_random_numbers is not None:
+            raise ValueError("proposal_break_rate cannot be combined with circular, ensemble or common_random_numbers")
+        target_breaks = breaks_to_try
+        breaks_to_try = get_breaks_to_try(cleavage_prob, breaks_per_nt = 1./proposal_break_rate)[0]
+        tables = likelihood_ratio_tables(cleavage_prob, target_breaks, breaks_to_try)
+    if channel_probs is not None:
+        if ensemble is not None:
+            raise ValueError("channel_probs cannot be combined with ensemble")
+        if channel_probs.shape[1] != nts or not np.allclose(np.sum(channel_probs, axis=0), cleavage_prob):
+            raise ValueError("channel_probs must sum to cleavage_prob at every position")
+        channel_cdf = np.cumsum(channel_probs, axis=0)[:-1]
+    if ensemble is not None:
+        if circular:
+            raise ValueError("ensembles are only supported on linear fibers")
+        present, shifts = ensemble
+        trials = len(present)
+        breaks_to_try = int(exp_breaks / ensemble_mean_cleavage_prob(cleavage_prob, present))
+    if window is not None:
+        if circular or common_random_numbers is not None:
+            raise ValueError("window cannot be combined with circular or common_random_numbers")
+        start, stop = window
+        window_fraction = (stop - start) / nts
+    if common_random_numbers is not None:
+        count_uniforms, location_uniforms = common_random_numbers
+        if location_uniforms.shape[1] < breaks_to_try:
+            raise ValueError("common_random_numbers were not drawn for this cleavage_prob")
+        if ensemble is not None and len(count_uniforms) != trials:
+            raise ValueError("common_random_numbers and ensemble must have the same number of trials")
+        trials = len(count_uniforms)
+    frag_blocks, midpt_blocks, trial_blocks, weight_blocks, channel_blocks = [], [], [], [], []
+    for first_trial in range(0, trials, block_size):
+        n = min(block_size, trials - first_trial)
+        probs = None
+        if common_random_numbers is not None:
+            rows = slice(first_trial, first_trial + n)
+            locs, uniforms, probs = _common_attempts(cleavage_prob, count_uniforms[rows], location_uniforms[rows], breaks_to_try,
+                                                     np.arange(first_trial, first_trial + n), ensemble)
+        elif window is not None:
+            # Number of attempts that land in the window; padding attempts are given a draw of 1 so they never cut
+            attempts = rng.binomial(breaks_to_try, window_fraction, size=n)
+            width = max(int(attempts.max(initial=0)), 1)
+            locs = rng.integers(start, stop, size=(n, width))
+            uniforms = rng.random((n, width))
+            uniforms[np.arange(width) >= attempts[:, None]] = 1.
+        else:
+            locs = rng.integers(0, nts, size=(n, breaks_to_try))
+            uniforms = rng.random((n, breaks_to_try))
+        if probs is None and ensemble is not None:
+            trial_idx = np.arange(first_trial, first_trial + n)[:, None]
+            probs = ensemble_cleavage_at(cleavage_prob, locs, trial_idx, present, shifts)
+        elif probs is None:
+            probs = cleavage_prob[locs]
+        labels = None
+        if channel_probs is not None:
+            # A successful draw u < p(x) is uniform on [0, p(x)), so it also picks the channel by inverse CDF
+            hit_trial, hit_break = np.nonzero(uniforms < probs)
+            hit_locs, hit_uniforms = locs[hit_trial, hit_break], uniforms[hit_trial, hit_break]
+            labels = np.zeros(locs.shape, dtype=np.uint8)
+            labels[hit_trial, hit_break] = np.sum(channel_cdf[:, hit_locs] <= hit_uniforms, axis=0)
+        frags, midpts, trial_ids, starts, *end_labels = _fragments_from_attempts(locs, uniforms, probs, nts, first_trial,
+                                                                                 circular, return_starts = True, labels = labels)
+        keep = frags > xmin
+        frag_blocks.append(frags[keep])
+        midpt_blocks.append(midpts[keep])
+        trial_blocks.append(trial_ids[keep])
+        if proposal_break_rate is not None:
+            weight_blocks.append(fragment_weights(starts[keep], frags[keep], tables))
+        if channel_probs is not None:
+            channel_blocks.append(end_labels[0][keep])
+    if midpoint is None:
+        midpoint = (fiber_midpoint - link_len) % nrl if circular else fiber_midpoint
+    fragment_set = FragmentSet(np.concatenate(frag_blocks), np.concatenate(midpt_blocks), np.concatenate(trial_blocks),
+                               num_trials = trials, midpoint = midpoint, period = nts if circular else None,
+                               weights = np.concatenate(weight_blocks) if weight_blocks else None,
+                               end_channels = np.concatenate(channel_blocks) if channel_blocks else None)
+    if save_data:
+        fragment_set.save('intermed_data/fragment_set.npz', writer)
+    return fragment_set
+
+
+def resimulate_fragment_set(fragment_set: FragmentSet, old_cleavage_prob: np.ndarray, new_cleavage_prob: np.ndarray,
+                            common_random_numbers: tuple, break_rate: int = break_rate, xmin: int = 0, ensemble: tuple = None,
+                            block_size: int = 1000):
+    """
+    Update a common-random-numbers simulation after part of the cleavage array has changed.
+
+    Only the trials whose breaks differ between the two arrays are re-simulated: trials with a
+    different number of breaks, or with a break placed differently because the probability mass
+    in front of it has changed. All other fragments are kept as they are.
+
+    Parameters
+    ----------
+    fragment_set : FragmentSet
+        Output of `simulate_fragment_set(old_cleavage_prob, common_random_numbers=...)`.
+
+    old_cleavage_prob : np.ndarray
+        Cleavage probability array used to produce `fragment_set`.
+
+    new_cleavage_prob : np.ndarray
+        Updated cleavage probability array (same length).
+
+    common_random_numbers : tuple of np.ndarray
+        The draws used to produce `fragment_set`. Must have enough breaks for both arrays.
+
+    break_rate : int
+        1 break per this many nucleotides.
+
+    xmin : int
+        Minimum fragment length to consider (exclusive). Must match the original simulation.
+
+    ensemble : tuple of np.ndarray, default None
+        The (present, shifts) used to produce `fragment_set`, if it came from an ensemble run. The cleavage
+        arrays are then the templates of the regular fiber, as in `simulate_fragment_set`.
+
+    block_size : int
+        Number of trials compared at once.
+
+    Returns
+    -------
+    fragment_set : FragmentSet
+        Same result as `simulate_fragment_set(new_cleavage_prob, common_random_numbers=..., ensemble=...)`.
+        Fragment sets with importance weights or damage channels are not supported.
+
+    affected_trials : np.ndarray
+        Trials that were re-simulated.
+    """
+    if len(old_cleavage_prob) != len(new_cleavage_prob):
+        raise ValueError("old and new cleavage_prob must have the same length")
+    if fragment_set.weights is not None or fragment_set.end_channels is not None:
+        raise ValueError("fragment sets with weights or damage channels cannot be resimulated")
+    count_uniforms, location_uniforms = common_random_numbers
+    nts = len(new_cleavage_prob)
+    if ensemble is not None:
+        present, shifts = ensemble
+        if len(present) != len(count_uniforms):
+            raise ValueError("common_random_numbers and ensemble must have the same number of trials")
+        exp_breaks = get_breaks_to_try(new_cleavage_prob, breaks_per_nt = 1./break_rate)[1]
+        old_breaks = int(exp_breaks / ensemble_mean_cleavage_prob(old_cleavage_prob, present))
+        new_breaks = int(exp_breaks / ensemble_mean_cleavage_prob(new_cleavage_prob, present))
+    else:
+        old_breaks = get_breaks_to_try(old_cleavage_prob, breaks_per_nt = 1./break_rate)[0]
+        new_breaks = get_breaks_to_try(new_cleavage_prob, breaks_per_nt = 1./break_rate)[0]
+    width = max(old_breaks, new_breaks)
+    if location_uniforms.shape[1] < width:
+        raise ValueError("common_random_numbers were not drawn for this cleavage_prob")
+
+    def cuts(cleavage_prob, breaks_to_try, trial_idx):
+        # Break positions of each trial (-1 for no break), padded to a common width
+        locs, uniforms, probs = _common_attempts(cleavage_prob, count_uniforms[trial_idx], location_uniforms[trial_idx],
+                                                 breaks_to_try, trial_idx, ensemble)
+        padded = np.full((len(trial_idx), width), -1, dtype=np.int64)
+        padded[:, :breaks_to_try] = np.where(uniforms < probs, locs, -1)
+        return padded, (locs, uniforms, probs)
+
+    frag_blocks, midpt_blocks, trial_blocks, affected_blocks = [], [], [], []
+    for first_trial in range(0, len(count_uniforms), block_size):
+        trial_idx = np.arange(first_trial, min(first_trial + block_size, len(count_uniforms)))
+        old_cuts = cuts(old_cleavage_prob, old_breaks, trial_idx)[0]
+        new_cuts, (locs, uniforms, probs) = cuts(new_cleavage_prob, new_breaks, trial_idx)
+        rows = np.flatnonzero(np.any(old_cuts != new_cuts, axis=1))
+        frags, midpts, sub_rows = _fragments_from_attempts(locs[rows], uniforms[rows], probs[rows], nts,
+                                                           circular = fragment_set.period is not None)
+        keep = frags > xmin
+        frag_blocks.append(frags[keep])
+        midpt_blocks.append(midpts[keep])
+        trial_blocks.append(trial_idx[rows][sub_rows[keep]])
+        affected_blocks.append(trial_idx[rows])
+    affected_trials = np.concatenate(affected_blocks)
+
+    unchanged = ~np.isin(fragment_set.trial_ids, affected_trials)
+    new_fragment_set = FragmentSet(np.concatenate([fragment_set.frag_lens[unchanged]] + frag_blocks),
+                                   np.concatenate([fragment_set.midpoints[unchanged]] + midpt_blocks),
+                                   np.concatenate([fragment_set.trial_ids[unchanged]] + trial_blocks),
+                                   num_trials = fragment_set.num_trials, midpoint = fragment_set.midpoint,
+                                   period = fragment_set.period)
+    return new_fragment_set, affected_trials
+
+
+def frag_mid_df(frag_lens: np.ndarray, midpts: np.ndarray, writer = None):
     """
     Make fragment lengths and locations into a pandas dataframe. 
     Limit to only fragment lengths of interest and add optional binning for sparse data.
@@ -159,6 +634,9 @@ def frag_mid_df(frag_lens: np.ndarray, midpts: np.ndarray):
     midpts : np.ndarray
         The center location of these fragments relative to the simulated nucleotide array.   
 
+    writer : AsyncWriter, default None
+        If given, the dataframe is saved in the background by this writer.
+
     Returns
     -------
     frags_and_mids : pd.DataFrame
@@ -178,19 +656,19 @@ def frag_mid_df(frag_lens: np.ndarray, midpts: np.ndarray):
     # Record midpoint relative to fragment center
     frags_and_mids["relative_mid"] = frags_and_mids["midpoints"] - fiber_midpoint
     # Save data
-    frags_and_mids.to_csv('intermed_data/fragment_lens_and_locations.csv')
+    save_csv(frags_and_mids, 'intermed_data/fragment_lens_and_locations.csv', writer)
     return frags_and_mids
 
 
-def vplot_data(df, max_frag: int = max_fragment_length, dist_from_center: int = distance_from_frag_center, bin_lens: int = 1, bin_locs: int = 10, save_data = 1):
+def vplot_data(df, max_frag: int = max_fragment_length, dist_from_center: int = distance_from_frag_center, bin_lens: int = 1, bin_locs: int = 10, save_data = 1, writer = None):
     """
     Take a dataframe with the fragment lengths and midpoints and generate
     a 2D array containing the vplot data.
     
     Parameters
     ---------
-    df : pd.DataFrame
-        Dataframe containing fragment lengths and midpoints 
+    df : pd.DataFrame or FragmentSet
+        Dataframe containing fragment lengths and midpoints. A FragmentSet is binned directly with `FragmentSet.to_vplot`.
 
     bin_lens : int, default = 1 
         Bin fragment lengths together for graphing sparser data
@@ -201,12 +679,20 @@ def vplot_data(df, max_frag: int = max_fragment_length, dist_from_center: int =
     save_data : bool
         Boolean indicating whether or not to save numpy array.
 
+    writer : AsyncWriter, default None
+        If given, the array is saved in the background by this writer.
+
     Returns
     -------
     vplot_input : np.ndarray
         Array of vplot data where each row is a fragment length and 
 
     """
+    if isinstance(df, FragmentSet):
+        vplot_arr = df.to_vplot(max_frag = max_frag, dist_from_center = dist_from_center, bin_lens = bin_lens, bin_locs = bin_locs)
+        if save_data:
+            save_array("intermed_data/vplot_arr.npy", vplot_arr, writer)
+        return vplot_arr
     min_range = -1. * dist_from_center
     max_range = dist_from_center
     # midpt_bin_width = 10.
@@ -218,7 +704,9 @@ def vplot_data(df, max_frag: int = max_fragment_length, dist_from_center: int =
     
     #To do in previous code make midpoint relative to fragment cetner
     frags_and_mids = df[(df.frag_len < max_frag) & (np.abs(df.relative_mid) < dist_from_center)]
-    vplot_arr, x_edges, y_edges = np.histogram2d(x=frags_and_mids["relative_mid"], y=frags_and_mids["frag_len"], bins=[len(bin_labels),len(bin_len_boundaries[:-1])])
+    # Fixed edges, as in FragmentSet.to_vplot, so that arrays from different runs line up
+    vplot_arr, x_edges, y_edges = np.histogram2d(x=frags_and_mids["relative_mid"], y=frags_and_mids["frag_len"], bins=[len(bin_labels),len(bin_len_boundaries[:-1])],
+                                                 range=[[min_range, max_range], [min_frag, max_frag]])
     if save_data:
-        np.save("intermed_data/vplot_arr.npy", vplot_arr)
+        save_array("intermed_data/vplot_arr.npy", vplot_arr, writer)
     return vplot_arr
@@ -0,0 +1,267 @@
+"""
+Compact, array-backed container for the fragments produced by a simulation.
+"""
+from .params import max_fragment_length, distance_from_frag_center, fiber_midpoint
+from .writer import save_array, save_npz
+import numpy as np
+import pandas as pd
+
+
+def _compact_dtype(max_value: int):
+    """
+    Smallest unsigned integer dtype able to hold values in [0, max_value].
+    """
+    return np.min_scalar_type(max(int(max_value), 1))
+
+
+class FragmentSet:
+    """
+    Fragment lengths, midpoints and trial IDs stored as compact integer arrays.
+
+    Fragments are kept sorted by length, so restricting to short fragments
+    (as done for the FLD and the v-plot) is a slice of the underlying arrays
+    rather than a copy. The midpoint relative to the fiber midpoint is computed
+    on demand instead of being stored.
+
+    Parameters
+    ----------
+    frag_lens : np.ndarray
+        Fragment lengths in nucleotides. Float input (e.g. from `get_fld`) is accepted as long as the values are whole numbers.
+
+    midpoints : np.ndarray
+        The center location of these fragments relative to the simulated nucleotide array.
+
+    trial_ids : np.ndarray, default None
+        Trial that produced each fragment. All fragments are assigned to trial 0 if not given.
+
+    num_trials : int, default None
+        Number of trials simulated. Inferred from `trial_ids` if not given.
+
+    midpoint : float
+        default: set in params.py
+        Reference position used to compute `relative_mid`.
+
+    period : int, default None
+        Length of the fiber if it is circular. Relative midpoints are then wrapped into
+        [-period/2, period/2), and the v-plot is tiled periodically. A circle cannot produce fragments
+        longer than itself, so histograms require `period > max_frag`.
+
+    weights : np.ndarray, default None
+        Weight of each fragment (e.g. importance sampling likelihood ratios). Histograms sum weights instead of counting.
+
+    end_channels : np.ndarray, default None
+        (fragments, 2) damage channel of the left and right end of each fragment (see `channel_flds`).
+    """
+
+    __slots__ = ("frag_lens", "midpoints", "trial_ids", "num_trials", "midpoint", "period", "weights", "end_channels")
+
+    def __init__(self, frag_lens: np.ndarray, midpoints: np.ndarray, trial_ids: np.ndarray = None,
+                 num_trials: int = None, midpoint: float = fiber_midpoint, period: int = None, weights: np.ndarray = None,
+                 end_channels: np.ndarray = None):
+        frag_lens = np.asarray(frag_lens)
+        midpoints = np.asarray(midpoints)
+        if trial_ids is None:
+            trial_ids = np.zeros(len(frag_lens), dtype=np.uint8)
+        trial_ids = np.asarray(trial_ids)
+        if not (len(frag_lens) == len(midpoints) == len(trial_ids)):
+            raise ValueError("frag_lens, midpoints and trial_ids must have the same length")
+        if num_trials is None:
+            num_trials = int(trial_ids.max()) + 1 if len(trial_ids) else 0
+
+        # Sort by fragment length so length cut-offs are slices
+        order = np.argsort(frag_lens, kind="stable")
+        max_pos = max(np.max(frag_lens, initial=0), np.max(midpoints, initial=0))
+        self.frag_lens = frag_lens[order].astype(_compact_dtype(max_pos))
+        self.midpoints = midpoints[order].astype(_compact_dtype(max_pos))
+        self.trial_ids = trial_ids[order].astype(_compact_dtype(num_trials))
+        self.num_trials = int(num_trials)
+        self.midpoint = midpoint
+        self.period = period
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)[order]
+        self.end_channels = None if end_channels is None else np.asarray(end_channels, dtype=np.uint8)[order]
+
+    def _view(self, sl: slice):
+        """
+        FragmentSet sharing memory with this one, restricted to `sl`.
+        """
+        view = object.__new__(type(self))
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(view, name, value[sl] if isinstance(value, np.ndarray) else value)
+        return view
+
+    def __len__(self):
+        return len(self.frag_lens)
+
+    def __repr__(self):
+        return "FragmentSet(" + str(len(self)) + " fragments, " + str(self.num_trials) + " trials)"
+
+    @property
+    def nbytes(self):
+        """
+        Total number of bytes held by the fragment arrays.
+        """
+        return sum(getattr(self, name).nbytes for name in self.__slots__ if isinstance(getattr(self, name), np.ndarray))
+
+    @property
+    def relative_mid(self):
+        """
+        Fragment midpoints relative to `midpoint` (computed, not stored).
+        """
+        rel_mid = self.midpoints.astype(np.int64) - self.midpoint
+        if self.period is not None:
+            rel_mid = (rel_mid + self.period / 2.) % self.period - self.period / 2.
+        return rel_mid
+
+    def _check_period(self, max_frag: int):
+        """
+        Raise if a circular fiber is too short to produce every fragment length below `max_frag`.
+        """
+        if self.period is not None and self.period <= max_frag:
+            raise ValueError("a circular fiber of " + str(self.period) + " nt cannot produce fragments up to max_frag = "
+                             + str(max_frag) + "; simulate a cell longer than max_frag")
+
+    def shorter_than(self, max_frag: int = max_fragment_length):
+        """
+        Zero-copy view of the fragments with length < `max_frag`.
+        """
+        return self._view(slice(0, np.searchsorted(self.frag_lens, max_frag, side="left")))
+
+    def longer_than(self, xmin: int = 0):
+        """
+        Zero-copy view of the fragments with length > `xmin`.
+        """
+        return self._view(slice(np.searchsorted(self.frag_lens, xmin, side="right"), len(self)))
+
+    def to_fld(self, max_frag: int = max_fragment_length, bin_lens: int = 1):
+        """
+        Histogram of fragment lengths shorter than `max_frag`.
+
+        Parameters
+        ----------
+        max_frag : int
+            default: set in params.py
+            Largest fragment length to consider (exclusive).
+
+        bin_lens : int, default = 1
+            Width of the fragment length bins.
+
+        Returns
+        -------
+        fld : np.ndarray
+            Counts per fragment length bin; bin i covers lengths [i*bin_lens, (i+1)*bin_lens).
+        """
+        self._check_period(max_frag)
+        short = self.shorter_than(max_frag)
+        return np.bincount(short.frag_lens // bin_lens, weights=short.weights,
+                           minlength=int(max_frag / bin_lens))[:int(max_frag / bin_lens)]
+
+    def vplot_bin_index(self, max_frag: int = max_fragment_length, dist_from_center: int = distance_from_frag_center,
+                        bin_lens: int = 1, bin_locs: int = 10):
+        """
+        Flattened v-plot bin of every fragment that falls inside the v-plot.
+
+        On a circular fiber every periodic image of a fragment inside the window is counted,
+        so a fragment can appear more than once.
+
+        Returns
+        -------
+        selected : np.ndarray
+            Index into `self.shorter_than(max_frag)` of the fragment behind each entry of `bin_idx`.
+
+        bin_idx : np.ndarray
+            Flattened (midpoint bin, length bin) index of each selected fragment.
+
+        shape : tuple
+            Shape of the v-plot array, (midpoint bins, fragment length bins).
+        """
+        self._check_period(max_frag)
+        short = self.shorter_than(max_frag)
+        rel_mid = short.relative_mid
+        if self.period is not None:
+            # Periodic images of each fragment that can reach into the window
+            num_images = int(np.ceil(dist_from_center / self.period))
+            images = np.arange(-num_images, num_images + 1)[:, None] * self.period
+            rel_mid = (rel_mid[None, :] + images).ravel()
+            selected = np.flatnonzero(np.abs(rel_mid) < dist_from_center)
+            rel_mid = rel_mid[selected]
+            selected = selected % len(short)
+        else:
+            selected = np.flatnonzero(np.abs(rel_mid) < dist_from_center)
+            rel_mid = rel_mid[selected]
+        num_loc_bins = int(2 * dist_from_center / bin_locs)
+        num_len_bins = int(max_frag / bin_lens)
+        loc_bin = np.floor((rel_mid + dist_from_center) * num_loc_bins / (2 * dist_from_center)).astype(np.int64)
+        len_bin = short.frag_lens[selected].astype(np.int64) * num_len_bins // max_frag
+        return selected, loc_bin * num_len_bins + len_bin, (num_loc_bins, num_len_bins)
+
+    def to_vplot(self, max_frag: int = max_fragment_length, dist_from_center: int = distance_from_frag_center,
+                 bin_lens: int = 1, bin_locs: int = 10, save_data=0, writer=None):
+        """
+        Generate the 2D v-plot array directly from the fragment arrays.
+
+        The array has the same shape as the one returned by `vplot_data`, but bin edges are
+        fixed by `dist_from_center` and `max_frag` rather than by the range of the data,
+        so arrays from different runs can be compared and summed.
+
+        Parameters
+        ----------
+        max_frag : int
+            default: set in params.py
+            Largest fragment length to consider (exclusive).
+
+        dist_from_center : int
+            default: set in params.py
+            Number of nucleotides away from `midpoint` to consider (exclusive).
+
+        bin_lens : int, default = 1
+            Bin fragment lengths together for graphing sparser data
+
+        bin_locs : int, default = 10.
+            Bin midpoint locations for graphing sparser data.
+
+        save_data : bool
+            Boolean indicating whether or not to save numpy array.
+
+        writer : AsyncWriter, default None
+            If given, the array is saved in the background by this writer.
+
+        Returns
+        -------
+        vplot_input : np.ndarray
+            Array of vplot data where each row is a midpoint bin and each column a fragment length bin.
+        """
+        selected, bin_idx, shape = self.vplot_bin_index(max_frag, dist_from_center, bin_lens, bin_locs)
+        weights = None if self.weights is None else self.shorter_than(max_frag).weights[selected]
+        vplot_arr = np.bincount(bin_idx, weights=weights, minlength=shape[0] * shape[1]).reshape(shape).astype(float)
+        if save_data:
+            save_array("intermed_data/vplot_arr.npy", vplot_arr, writer)
+        return vplot_arr
+
+    def to_dataframe(self):
+        """
+        Dataframe with the same columns as the one returned by `frag_mid_df`.
+        """
+        return pd.DataFrame({'frag_len': self.frag_lens, 'midpoints': self.midpoints, 'relative_mid': self.relative_mid})
+
+    def save(self, path: str = "intermed_data/fragment_set.npz", writer=None):
+        """
+        Save the fragment arrays to a compressed .npz file, in the background if an `AsyncWriter` is given.
+        """
+        save_npz(path, writer, frag_lens=self.frag_lens, midpoints=self.midpoints, trial_ids=self.trial_ids,
+                            num_trials=self.num_trials, midpoint=self.midpoint,
+                            period=-1 if self.period is None else self.period,
+                            weights=np.array([]) if self.weights is None else self.weights,
+                            end_channels=np.zeros((0, 2), dtype=np.uint8) if self.end_channels is None else self.end_channels)
+
+    @classmethod
+    def load(cls, path: str = "intermed_data/fragment_set.npz"):
+        """
+        Load a FragmentSet written by `FragmentSet.save`.
+        """
+        with np.load(path) as data:
+            period = int(data["period"]) if "period" in data.files and int(data["period"]) >= 0 else None
+            weights = data["weights"] if "weights" in data.files and len(data["weights"]) == len(data["frag_lens"]) else None
+            end_channels = data["end_channels"] if "end_channels" in data.files and len(data["end_channels"]) == len(data["frag_lens"]) else None
+            return cls(data["frag_lens"], data["midpoints"], data["trial_ids"], num_trials=int(data["num_trials"]),
+                       midpoint=float(data["midpoint"]), period=period, weights=weights, end_channels=end_channels)
@@ -0,0 +1,185 @@
+"""
+Importance sampling of long fragments.
+
+Long fragments are rare at the target break rate because they need a long stretch without any
+cut. Trials are instead run at a lower (proposal) break rate, where long fragments are common,
+and every fragment is weighted by the ratio of its probability at the target rate to its
+probability at the proposal rate. The weighted histograms are unbiased estimates of the
+target-rate histograms for the same number of trials.
+
+Each trial makes a fixed number B of attempts, each landing on position x and cutting it with
+probability p(x) = c(x)/nts, so cuts at different positions are negatively correlated. A fragment
+from a to b needs at least one hit on a, at least one on b and none on the s = sum_{a<x<b} p(x)
+in between; by inclusion-exclusion its exact probability is
+
+    P(a, b) = (1-s)**B - (1-s-p(a))**B - (1-s-p(b))**B + (1-s-p(a)-p(b))**B,
+
+which needs only p at the two ends and a prefix sum of p, so weights cost O(1) per fragment.
+"""
+from .params import max_fragment_length, distance_from_frag_center
+import numpy as np
+
+
+def fragment_log_probs(starts: np.ndarray, frag_lens: np.ndarray, hit_prob: np.ndarray, hit_prefix: np.ndarray,
+                       breaks_to_try: int):
+    """
+    Log probability that a trial of `breaks_to_try` attempts produces each fragment.
+
+    Parameters
+    ----------
+    starts : np.ndarray
+        Position of the first cut of each fragment.
+
+    frag_lens : np.ndarray
+        Fragment lengths.
+
+    hit_prob : np.ndarray
+        Probability p(x) = c(x)/nts that one attempt cuts position x.
+
+    hit_prefix : np.ndarray
+        Prefix sums (length nts + 1) of `hit_prob`.
+
+    breaks_to_try : int
+        Number of attempts per trial.
+
+    Returns
+    -------
+    log_probs : np.ndarray
+        log P(a, b) of each fragment; -inf for fragments that cannot occur.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = starts + np.asarray(frag_lens, dtype=np.int64)
+    p_start, p_end = hit_prob[starts], hit_prob[ends]
+    no_interior = 1. - (hit_prefix[ends] - hit_prefix[starts + 1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # P = (1-s)**B * [(1 - r_a)(1 - r_b) + r_a r_b (r_ab / (r_a r_b) - 1)] with r_a = (1 - p(a)/(1-s))**B, ...,
+        # written with expm1 so that nothing cancels when B p(a) and B p(b) are small
+        log_miss_start = breaks_to_try * np.log1p(-p_start / no_interior)
+        log_miss_end = breaks_to_try * np.log1p(-p_end / no_interior)
+        log_miss_both = breaks_to_try * np.log1p(-p_start * p_end / ((no_interior - p_start) * (no_interior - p_end)))
+        both_hit = np.expm1(log_miss_start) * np.expm1(log_miss_end) + np.exp(log_miss_start + log_miss_end) * np.expm1(log_miss_both)
+        return breaks_to_try * np.log(no_interior) + np.log(np.maximum(both_hit, 0.))
+
+
+def likelihood_ratio_tables(cleavage_prob: np.ndarray, target_breaks: int, proposal_breaks: int):
+    """
+    Tables needed to compute fragment likelihood ratios in O(1) per fragment.
+
+    Returns
+    -------
+    hit_prob : np.ndarray
+        Probability p(x) = c(x)/nts that one attempt cuts position x.
+
+    hit_prefix : np.ndarray
+        Prefix sums (length nts + 1) of `hit_prob`.
+
+    target_breaks, proposal_breaks : int
+        Number of attempts per trial at the target and proposal break rates.
+    """
+    hit_prob = np.asarray(cleavage_prob, dtype=float) / len(cleavage_prob)
+    hit_prefix = np.concatenate([[0.], np.cumsum(hit_prob)])
+    return hit_prob, hit_prefix, target_breaks, proposal_breaks
+
+
+def fragment_weights(starts: np.ndarray, frag_lens: np.ndarray, tables: tuple):
+    """
+    Likelihood ratio of each fragment at the target break rate relative to the proposal break rate.
+
+    Parameters
+    ----------
+    starts : np.ndarray
+        Position of the first cut of each fragment.
+
+    frag_lens : np.ndarray
+        Fragment lengths.
+
+    tables : tuple
+        Output of `likelihood_ratio_tables`.
+
+    Returns
+    -------
+    weights : np.ndarray
+        Weight of each fragment; 0 for fragments the proposal cannot produce.
+    """
+    hit_prob, hit_prefix, target_breaks, proposal_breaks = tables
+    log_target = fragment_log_probs(starts, frag_lens, hit_prob, hit_prefix, target_breaks)
+    log_proposal = fragment_log_probs(starts, frag_lens, hit_prob, hit_prefix, proposal_breaks)
+    with np.errstate(invalid="ignore"):
+        return np.where(np.isfinite(log_proposal), np.exp(log_target - log_proposal), 0.)
+
+
+def _estimate_and_variance(trial_ids: np.ndarray, bin_idx: np.ndarray, weights: np.ndarray, num_bins: int, num_trials: int):
+    """
+    Sum of weights per bin and its variance across trials, T/(T-1) * sum_t (X_t - mean)**2.
+    """
+    estimate = np.bincount(bin_idx, weights=weights, minlength=num_bins)
+    # Sum the weights of each (trial, bin) pair, then square to get sum_t X_t**2 per bin
+    keys, inverse = np.unique(trial_ids.astype(np.int64) * num_bins + bin_idx, return_inverse=True)
+    per_trial = np.bincount(inverse, weights=weights)
+    sum_sq = np.bincount(keys % num_bins, weights=per_trial ** 2, minlength=num_bins)
+    if num_trials < 2:
+        return estimate, np.full(num_bins, np.nan)
+    variance = num_trials / (num_trials - 1.) * (sum_sq - estimate ** 2 / num_trials)
+    return estimate, np.maximum(variance, 0.)
+
+
+def weighted_fld(fragment_set, max_frag: int = max_fragment_length, bin_lens: int = 1):
+    """
+    Importance-weighted FLD and the variance of each bin.
+
+    Parameters
+    ----------
+    fragment_set : FragmentSet
+        Fragments with weights, e.g. from `simulate_fragment_set(proposal_break_rate=...)`.
+
+    max_frag : int
+        default: set in params.py
+        Largest fragment length to consider (exclusive).
+
+    bin_lens : int, default = 1
+        Width of the fragment length bins.
+
+    Returns
+    -------
+    fld : np.ndarray
+        Estimated fragment counts per length bin at the target break rate, for `fragment_set.num_trials` trials.
+
+    variance : np.ndarray
+        Estimated variance of each bin of `fld`.
+    """
+    fragment_set._check_period(max_frag)
+    short = fragment_set.shorter_than(max_frag)
+    num_len_bins = int(max_frag / bin_lens)
+    len_bin = short.frag_lens.astype(np.int64) // bin_lens
+    keep = len_bin < num_len_bins
+    weights = np.ones(len(short)) if short.weights is None else short.weights
+    return _estimate_and_variance(short.trial_ids[keep], len_bin[keep], weights[keep], num_len_bins, fragment_set.num_trials)
+
+
+def weighted_vplot(fragment_set, max_frag: int = max_fragment_length, dist_from_center: int = distance_from_frag_center,
+                   bin_lens: int = 1, bin_locs: int = 10):
+    """
+    Importance-weighted v-plot and the variance of each bin.
+
+    Parameters
+    ----------
+    fragment_set : FragmentSet
+        Fragments with weights, e.g. from `simulate_fragment_set(proposal_break_rate=...)`.
+
+    max_frag, dist_from_center, bin_lens, bin_locs :
+        Binning, as in `FragmentSet.to_vplot`.
+
+    Returns
+    -------
+    vplot_arr : np.ndarray
+        Estimated v-plot counts at the target break rate.
+
+    variance : np.ndarray
+        Estimated variance of each bin of `vplot_arr`.
+    """
+    selected, bin_idx, shape = fragment_set.vplot_bin_index(max_frag, dist_from_center, bin_lens, bin_locs)
+    short = fragment_set.shorter_than(max_frag)
+    weights = np.ones(len(selected)) if short.weights is None else short.weights[selected]
+    estimate, variance = _estimate_and_variance(short.trial_ids[selected], bin_idx, weights, shape[0] * shape[1],
+                                                fragment_set.num_trials)
+    return estimate.reshape(shape), variance.reshape(shape)
@@ -0,0 +1,114 @@
+"""
+Heterogeneous nucleosome fibers: each trial draws which nucleosomes are present and how far each one is shifted.
+
+Per-trial cleavage profiles are never built. The cleavage probability of an attempted break is
+looked up in the shared nucleosome template at the break's offset from the (shifted) nucleosome
+that covers it, so a heterogeneous population costs about the same as the homogeneous fiber.
+"""
+from .params import num_nucs, link_len, wrap
+import numpy as np
+
+
+def sample_ensemble(trials: int, occupancy: float = 1.0, fuzziness: float = 0.0, num_nucs: int = num_nucs,
+                    linker_length: int = link_len, seed=None):
+    """
+    Draw nucleosome occupancy and positional shifts for every trial.
+
+    Parameters
+    ----------
+    trials : int
+        Number of trials.
+
+    occupancy : float or np.ndarray
+        Probability that each nucleosome is present. An array of length `num_nucs` sets it per nucleosome.
+
+    fuzziness : float or np.ndarray
+        Standard deviation (nt) of each nucleosome's shift from its position in the regular array.
+        Shifts are rounded and clipped to +/- half the linker length so neighbouring nucleosomes never overlap.
+
+    num_nucs : int
+        default: set in params.py
+        Number of nucleosomes in the fiber.
+
+    linker_length : int
+        default: set in params.py
+        Number of base pairs in the DNA linking neighboring nucleosomes.
+
+    seed : int or np.random.SeedSequence, default None
+        Seed for numpy's random generator.
+
+    Returns
+    -------
+    present : np.ndarray
+        (trials, num_nucs) boolean array, True where the nucleosome is present.
+
+    shifts : np.ndarray
+        (trials, num_nucs) integer array of shifts in nucleotides.
+    """
+    rng = np.random.default_rng(seed)
+    present = rng.random((trials, num_nucs)) < occupancy
+    max_shift = linker_length // 2
+    shifts = np.clip(np.rint(rng.normal(0., 1., (trials, num_nucs)) * fuzziness), -max_shift, max_shift).astype(np.int64)
+    return present, shifts
+
+
+def ensemble_cleavage_at(template: np.ndarray, locs: np.ndarray, trial_idx: np.ndarray, present: np.ndarray,
+                         shifts: np.ndarray, linker_length: int = link_len, wrap_bp: int = wrap):
+    """
+    Cleavage probability at attempted break locations for each trial's own fiber.
+
+    Parameters
+    ----------
+    template : np.ndarray
+        Regular fiber from `generate_cleav_prob`. Its first nucleosome (positions `linker_length`
+        to `linker_length + wrap_bp`) is used as the nucleosome profile and its first position as the linker probability.
+
+    locs : np.ndarray
+        Nucleotide positions on which breaks are attempted.
+
+    trial_idx : np.ndarray
+        Trial of each attempt (broadcastable against `locs`).
+
+    present, shifts : np.ndarray
+        Output of `sample_ensemble`.
+
+    linker_length : int
+        default: set in params.py
+        Number of base pairs in the DNA linking neighboring nucleosomes.
+
+    wrap_bp : int
+        default: set in params.py
+        Number of base pairs wrapped around the nucleosome.
+
+    Returns
+    -------
+    probs : np.ndarray
+        Cleavage probability at each attempted location, shaped like `locs`.
+    """
+    nuc_prob_arr = template[linker_length:linker_length + wrap_bp]
+    repeat = linker_length + wrap_bp
+    num_nucs = present.shape[1]
+    trial_idx = np.broadcast_to(trial_idx, locs.shape)
+    probs = np.full(locs.shape, template[0], dtype=float)
+    nearest = (locs - linker_length) // repeat
+    # A shifted nucleosome can only reach into its own repeat or a neighbouring one
+    for neighbour in (-1, 0, 1):
+        nuc = nearest + neighbour
+        valid = (nuc >= 0) & (nuc < num_nucs)
+        nuc = np.clip(nuc, 0, num_nucs - 1)
+        offset = locs - (linker_length + nuc * repeat + shifts[trial_idx, nuc])
+        covered = valid & present[trial_idx, nuc] & (offset >= 0) & (offset < wrap_bp)
+        probs[covered] = nuc_prob_arr[offset[covered]]
+    return probs
+
+
+def ensemble_mean_cleavage_prob(template: np.ndarray, present: np.ndarray, linker_length: int = link_len,
+                                wrap_bp: int = wrap):
+    """
+    Cleavage probability averaged over positions and over the trials of an ensemble.
+
+    Used in place of the mean of a single fiber when computing the number of breaks to try.
+    """
+    nuc_prob_arr = template[linker_length:linker_length + wrap_bp]
+    missing_per_trial = np.mean(np.sum(~present, axis=1))
+    return (np.sum(template) + missing_per_trial * (template[0] * wrap_bp - np.sum(nuc_prob_arr))) / len(template)
@@ -0,0 +1,253 @@
+"""
+Mergeable partial results, so that one simulation can be split across processes or cluster jobs.
+
+A partial holds the FLD and v-plot counts of a shard of trials together with everything needed
+to check that shards can be summed: a format version, a hash of the configuration and the IDs
+of the random seed streams that produced it. `reduce_partials` validates and sums any number
+of partials; `run_sharded` is a local launcher that runs shards in independent processes.
+
+Partials can also be reduced from the command line::
+
+    python -m fragments_from_footprinting.partials reduce merged.npz shard_*.npz
+"""
+from .params import max_fragment_length, distance_from_frag_center, break_rate, num_trials
+from .fragment_lengths import simulate_fragment_set
+from .writer import save_array, save_npz
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+
+PARTIAL_FORMAT_VERSION = 2
+
+
+def config_hash(cleavage_prob: np.ndarray, break_rate: int = break_rate, xmin: int = 0, max_frag: int = max_fragment_length,
+                dist_from_center: int = distance_from_frag_center, bin_lens: int = 1, bin_locs: int = 10, period: int = None,
+                midpoint: float = None, weighted: bool = False, simulation_settings: dict = None):
+    """
+    Hash of everything that must agree for two partials to be summed.
+
+    Parameters
+    ----------
+    period, midpoint, weighted :
+        `FragmentSet.period`, `FragmentSet.midpoint` and whether the fragment set has importance weights.
+
+    simulation_settings : dict, default None
+        Any other settings that change the simulated fragments, e.g. the `window` or `proposal_break_rate`
+        of `simulate_fragment_set`, or the occupancy and fuzziness of an ensemble.
+
+    Returns
+    -------
+    digest : str
+        Hex SHA-256 digest of the cleavage probabilities, break rate, minimum fragment length, binning,
+        fiber geometry and simulation settings.
+    """
+    settings = json.dumps({"break_rate": break_rate, "xmin": xmin, "max_frag": max_frag, "dist_from_center": dist_from_center,
+                           "bin_lens": bin_lens, "bin_locs": bin_locs, "period": period, "midpoint": midpoint,
+                           "weighted": bool(weighted), "simulation_settings": simulation_settings or {}},
+                          sort_keys=True, default=str)
+    digest = hashlib.sha256(np.ascontiguousarray(cleavage_prob, dtype=np.float64).tobytes())
+    digest.update(settings.encode())
+    return digest.hexdigest()
+
+
+def seed_stream_id(seed_sequence: np.random.SeedSequence):
+    """
+    String identifying a seed stream, e.g. '1234:0' for the first stream spawned from entropy 1234.
+    """
+    return str(seed_sequence.entropy) + ":" + ".".join(str(key) for key in seed_sequence.spawn_key)
+
+
+def make_partial(fragment_set, cleavage_prob: np.ndarray, seed_stream_ids: list, break_rate: int = break_rate, xmin: int = 0,
+                 max_frag: int = max_fragment_length, dist_from_center: int = distance_from_frag_center, bin_lens: int = 1,
+                 bin_locs: int = 10, simulation_settings: dict = None):
+    """
+    Reduce a FragmentSet to a mergeable partial result.
+
+    Parameters
+    ----------
+    fragment_set : FragmentSet
+        Fragments from one shard of trials.
+
+    cleavage_prob : np.ndarray
+        Probability of cleavage corresponding to each nucleotide position, as simulated.
+
+    seed_stream_ids : list of str
+        IDs (from `seed_stream_id`) of the random streams used for this shard.
+
+    break_rate, xmin, max_frag, dist_from_center, bin_lens, bin_locs :
+        Simulation and binning settings, as in `simulate_fragment_set` and `FragmentSet.to_vplot`.
+
+    simulation_settings : dict, default None
+        Settings of `simulate_fragment_set` not recorded in the fragment set, which must agree between shards:
+        e.g. {'window': (start, stop)}, {'occupancy': 0.8, 'fuzziness': 10} for an ensemble, or
+        {'proposal_break_rate': 300}. Required for importance-weighted fragment sets.
+
+    Returns
+    -------
+    partial : dict
+        Keys 'version', 'config_hash', 'seed_streams', 'num_trials', 'fld' and 'vplot'.
+    """
+    weighted = fragment_set.weights is not None
+    if weighted and "proposal_break_rate" not in (simulation_settings or {}):
+        raise ValueError("weighted fragment sets need their proposal_break_rate in simulation_settings")
+    return {"version": PARTIAL_FORMAT_VERSION,
+            "config_hash": config_hash(cleavage_prob, break_rate, xmin, max_frag, dist_from_center, bin_lens, bin_locs,
+                                       fragment_set.period, fragment_set.midpoint, weighted, simulation_settings),
+            "seed_streams": np.asarray(seed_stream_ids, dtype=str),
+            "num_trials": fragment_set.num_trials,
+            "fld": fragment_set.to_fld(max_frag, bin_lens),
+            "vplot": fragment_set.to_vplot(max_frag, dist_from_center, bin_lens, bin_locs)}
+
+
+def save_partial(partial: dict, path: str, writer = None):
+    """
+    Write a partial result to a .npz file, in the background if an `AsyncWriter` is given.
+    """
+    save_npz(path, writer, **partial)
+
+
+def load_partial(path: str):
+    """
+    Read a partial result written by `save_partial`.
+    """
+    with np.load(path) as data:
+        partial = {key: data[key] for key in data.files}
+    partial["version"] = int(partial["version"])
+    partial["config_hash"] = str(partial["config_hash"])
+    partial["num_trials"] = int(partial["num_trials"])
+    return partial
+
+
+def reduce_partials(partials: list, save_data = 0, writer = None):
+    """
+    Validate and sum partial results.
+
+    Parameters
+    ----------
+    partials : list of dict or str
+        Partials (or paths to partials written by `save_partial`).
+
+    save_data : bool
+        Boolean indicating whether or not to save the merged v-plot and FLD in intermed_data.
+
+    writer : AsyncWriter, default None
+        If given, the arrays are saved in the background by this writer.
+
+    Returns
+    -------
+    merged : dict
+        A partial covering all trials of the inputs.
+    """
+    partials = [load_partial(p) if isinstance(p, (str, os.PathLike)) else p for p in partials]
+    if len(partials) == 0:
+        raise ValueError("no partials to reduce")
+    first = partials[0]
+    for partial in partials:
+        if partial["version"] != PARTIAL_FORMAT_VERSION:
+            raise ValueError("unsupported partial format version: " + str(partial["version"]))
+        if partial["config_hash"] != first["config_hash"]:
+            raise ValueError("partials were produced with different configurations")
+        if partial["fld"].shape != first["fld"].shape or partial["vplot"].shape != first["vplot"].shape:
+            raise ValueError("partials have different binning")
+    seed_streams = np.concatenate([partial["seed_streams"] for partial in partials])
+    if len(np.unique(seed_streams)) != len(seed_streams):
+        raise ValueError("the same seed stream appears in more than one partial")
+    merged = {"version": PARTIAL_FORMAT_VERSION,
+              "config_hash": first["config_hash"],
+              "seed_streams": seed_streams,
+              "num_trials": sum(partial["num_trials"] for partial in partials),
+              "fld": np.sum([partial["fld"] for partial in partials], axis=0),
+              "vplot": np.sum([partial["vplot"] for partial in partials], axis=0)}
+    if save_data:
+        save_array("intermed_data/vplot_arr.npy", merged["vplot"], writer)
+        save_array("intermed_data/fld_counts.npy", merged["fld"], writer)
+    return merged
+
+
+def simulate_partial(cleavage_prob: np.ndarray, trials: int, seed_sequence: np.random.SeedSequence, break_rate: int = break_rate,
+                     xmin: int = 0, max_frag: int = max_fragment_length, dist_from_center: int = distance_from_frag_center,
+                     bin_lens: int = 1, bin_locs: int = 10):
+    """
+    Simulate one shard of trials from its own seed stream and return it as a partial.
+    """
+    fragment_set = simulate_fragment_set(cleavage_prob, trials = trials, break_rate = break_rate, xmin = xmin, seed = seed_sequence)
+    return make_partial(fragment_set, cleavage_prob, [seed_stream_id(seed_sequence)], break_rate, xmin, max_frag,
+                        dist_from_center, bin_lens, bin_locs)
+
+
+def run_sharded(cleavage_prob: np.ndarray, trials: int = num_trials, num_shards: int = 4, seed=None, break_rate: int = break_rate,
+                xmin: int = 0, max_frag: int = max_fragment_length, dist_from_center: int = distance_from_frag_center,
+                bin_lens: int = 1, bin_locs: int = 10, out_dir: str = None, max_workers: int = None, save_data = 0, writer = None):
+    """
+    Split `trials` across `num_shards` independent processes and reduce their partials.
+
+    Each shard gets its own seed stream spawned from `seed`, so the shards are statistically
+    independent and the run is reproducible for a fixed `seed` and `num_shards`.
+
+    Parameters
+    ----------
+    cleavage_prob : np.ndarray
+        Probability of cleavage corresponding to each nucleotide position.
+
+    trials : int
+        Total number of trials over all shards.
+
+    num_shards : int
+        Number of shards (processes).
+
+    seed : int, default None
+        Root seed from which the shard seed streams are spawned.
+
+    break_rate, xmin, max_frag, dist_from_center, bin_lens, bin_locs :
+        Simulation and binning settings, as in `simulate_fragment_set` and `FragmentSet.to_vplot`.
+
+    out_dir : str, default None
+        If given, each shard's partial is also written to `out_dir/partial_<shard>.npz`, as a cluster job would.
+
+    max_workers : int, default None
+        Maximum number of worker processes (defaults to `num_shards`).
+
+    save_data : bool
+        Boolean indicating whether or not to save the merged v-plot and FLD in intermed_data.
+
+    writer : AsyncWriter, default None
+        If given, the shard partials and the merged arrays are saved in the background by this writer.
+
+    Returns
+    -------
+    merged : dict
+        Reduced partial over all shards.
+    """
+    seed_sequences = np.random.SeedSequence(seed).spawn(num_shards)
+    shard_trials = [len(shard) for shard in np.array_split(np.arange(trials), num_shards)]
+    with ProcessPoolExecutor(max_workers=max_workers or num_shards) as executor:
+        futures = [executor.submit(simulate_partial, cleavage_prob, n, seq, break_rate, xmin, max_frag, dist_from_center,
+                                   bin_lens, bin_locs) for n, seq in zip(shard_trials, seed_sequences)]
+        partials = [future.result() for future in futures]
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+        for shard, partial in enumerate(partials):
+            save_partial(partial, os.path.join(out_dir, "partial_" + str(shard) + ".npz"), writer)
+    return reduce_partials(partials, save_data = save_data, writer = writer)
+
+
+def _main(argv: list = None):
+    """
+    Command line entry point: `reduce OUTPUT INPUT [INPUT ...]`.
+    """
+    parser = argparse.ArgumentParser(prog="python -m fragments_from_footprinting.partials")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    reduce_parser = subparsers.add_parser("reduce", help="validate and sum partial results")
+    reduce_parser.add_argument("output", help="path of the merged partial (.npz)")
+    reduce_parser.add_argument("inputs", nargs="+", help="partials to merge")
+    args = parser.parse_args(argv)
+    merged = reduce_partials(args.inputs)
+    save_partial(merged, args.output)
+    print("reduced " + str(len(args.inputs)) + " partials (" + str(merged["num_trials"]) + " trials) into " + args.output)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,235 @@
+"""
+Estimate nucleosome periodicity (the repeat length) from fragment length distributions and v-plots with FFTs.
+
+All functions operate on the last axis and broadcast over any leading axes, so a whole
+sweep of histograms (e.g. a (num_configs, num_bins) stack) is analysed in one call.
+Observed fragments can be analysed the same way once binned, e.g. with
+`FragmentSet(frag_lens, midpoints).to_fld()`.
+"""
+import numpy as np
+
+
+def _moving_average(hists: np.ndarray, window: int):
+    """
+    Centered moving average along the last axis with reflected edges.
+    """
+    window = max(int(window) // 2 * 2 + 1, 1)
+    half = window // 2
+    padded = np.pad(hists, [(0, 0)] * (hists.ndim - 1) + [(half, half)], mode="reflect")
+    csum = np.cumsum(padded, axis=-1)
+    csum = np.concatenate([np.zeros(csum.shape[:-1] + (1,)), csum], axis=-1)
+    return (csum[..., window:] - csum[..., :-window]) / window
+
+
+def detrend(hists: np.ndarray, bin_width: float = 1, trend_length: float = 300, smooth_length: float = 10):
+    """
+    Remove the slowly decaying background of a histogram so that only the oscillation is left.
+
+    Parameters
+    ----------
+    hists : np.ndarray
+        Histograms along the last axis.
+
+    bin_width : float
+        Width of each bin in nucleotides.
+
+    trend_length : float
+        Length (nt) of the moving average subtracted as background. Should be about the largest period of interest.
+
+    smooth_length : float
+        Length (nt) of the moving average applied to suppress bin-to-bin noise.
+
+    Returns
+    -------
+    detrended : np.ndarray
+        Smoothed histograms relative to their background, (smoothed - trend) / trend, so that the
+        oscillation has the same amplitude at short and long fragment lengths. Bins with no background are 0.
+    """
+    hists = np.asarray(hists, dtype=float)
+    trend = _moving_average(hists, trend_length / bin_width)
+    smoothed = _moving_average(hists, smooth_length / bin_width)
+    return np.divide(smoothed - trend, trend, out=np.zeros_like(trend), where=trend > 0)
+
+
+def autocorrelation(hists: np.ndarray):
+    """
+    Autocorrelation along the last axis, computed with a zero-padded FFT.
+
+    Parameters
+    ----------
+    hists : np.ndarray
+        Signals along the last axis (typically the output of `detrend`).
+
+    Returns
+    -------
+    acf : np.ndarray
+        Autocorrelation for lags 0 to n-1 (in bins), normalized so that lag 0 is 1. Each lag is divided by
+        the number of overlapping bins, so that long lags are not biased towards zero.
+    """
+    hists = np.asarray(hists, dtype=float)
+    n = hists.shape[-1]
+    centered = hists - hists.mean(axis=-1, keepdims=True)
+    spectrum = np.fft.rfft(centered, n=2 * n, axis=-1)
+    acf = np.fft.irfft(spectrum * np.conj(spectrum), n=2 * n, axis=-1)[..., :n] / np.arange(n, 0, -1)
+    lag0 = acf[..., :1].copy()
+    lag0[lag0 == 0] = 1.
+    return acf / lag0
+
+
+def power_spectrum(hists: np.ndarray, bin_width: float = 1):
+    """
+    Power spectrum along the last axis.
+
+    Parameters
+    ----------
+    hists : np.ndarray
+        Signals along the last axis (typically the output of `detrend`).
+
+    bin_width : float
+        Width of each bin in nucleotides.
+
+    Returns
+    -------
+    freqs : np.ndarray
+        Frequencies in cycles per nucleotide.
+
+    power : np.ndarray
+        Power at each frequency.
+    """
+    hists = np.asarray(hists, dtype=float)
+    centered = hists - hists.mean(axis=-1, keepdims=True)
+    power = np.abs(np.fft.rfft(centered, axis=-1)) ** 2
+    return np.fft.rfftfreq(hists.shape[-1], d=bin_width), power
+
+
+def estimate_repeat_length(hists: np.ndarray, bin_width: float = 1, min_period: float = 100, max_period: float = 300,
+                           peak_fraction: float = 0.5):
+    """
+    Estimate the nucleosome repeat length from the periodicity of one or many histograms.
+
+    The repeat length is the lag of the first autocorrelation peak between `min_period` and
+    `max_period` that reaches `peak_fraction` of the highest peak there (so that a multiple of the
+    repeat length is not picked), refined by parabolic interpolation. The signal-to-noise ratio is the power at
+    the corresponding frequency divided by the median power at frequencies above 1 / `max_period`.
+
+    Parameters
+    ----------
+    hists : np.ndarray
+        FLDs (or v-plot rows/columns) along the last axis. Leading axes are treated as a batch.
+
+    bin_width : float
+        Width of each bin in nucleotides.
+
+    min_period : float
+        Smallest repeat length (nt) to consider.
+
+    max_period : float
+        Largest repeat length (nt) to consider.
+
+    peak_fraction : float
+        Fraction of the highest autocorrelation peak that the first peak must reach to be taken as the fundamental.
+
+    Returns
+    -------
+    repeat_length : np.ndarray
+        Estimated repeat length in nucleotides for each histogram (NaN if the histogram is too short or has no signal).
+
+    peaks : np.ndarray
+        Boolean mask, shaped like `hists`, marking the ladder peaks (local maxima of the detrended
+        histogram within half a repeat length). Use `np.flatnonzero(peaks[i]) * bin_width` for positions.
+
+    snr : np.ndarray
+        Signal-to-noise ratio of the periodic component.
+    """
+    hists = np.asarray(hists, dtype=float)
+    detrended = detrend(hists, bin_width, trend_length=max_period)
+    acf = autocorrelation(detrended)
+    n = hists.shape[-1]
+    lo = max(int(np.ceil(min_period / bin_width)), 1)
+    hi = min(int(np.floor(max_period / bin_width)), n - 2)
+    if hi <= lo:
+        nan = np.full(hists.shape[:-1], np.nan)
+        return nan, np.zeros(hists.shape, dtype=bool), nan
+
+    # First autocorrelation peak within the allowed lags that reaches `peak_fraction` of the highest one. Taking the
+    # highest peak instead can return a multiple of the repeat length, since the ACF is not biased towards short lags.
+    window = acf[..., lo - 1:hi + 2]
+    inner = window[..., 1:-1]
+    local_max = (inner >= window[..., :-2]) & (inner >= window[..., 2:])
+    highest = inner.max(axis=-1, keepdims=True)
+    candidates = local_max & (inner > 0) & (inner >= peak_fraction * highest)
+    first = np.argmax(candidates, axis=-1)
+    lag = lo + np.where(candidates.any(axis=-1), first, np.argmax(inner, axis=-1))
+    # Refine with a parabola through its neighbours
+    y0 = np.take_along_axis(acf, (lag - 1)[..., None], axis=-1)[..., 0]
+    y1 = np.take_along_axis(acf, lag[..., None], axis=-1)[..., 0]
+    y2 = np.take_along_axis(acf, (lag + 1)[..., None], axis=-1)[..., 0]
+    curvature = y0 - 2 * y1 + y2
+    offset = np.divide(0.5 * (y0 - y2), curvature, out=np.zeros_like(y1), where=curvature < 0)
+    repeat_length = (lag + np.clip(offset, -0.5, 0.5)) * bin_width
+
+    # Power at the estimated fundamental frequency relative to the noise floor
+    freqs, power = power_spectrum(detrended, bin_width)
+    fundamental = np.clip(np.rint(n * bin_width / repeat_length).astype(int), 1, len(freqs) - 1)
+    signal = np.take_along_axis(power, fundamental[..., None], axis=-1)[..., 0]
+    noise = np.median(power[..., freqs > 1. / max_period], axis=-1)
+    snr = np.divide(signal, noise, out=np.full_like(signal, np.inf), where=noise > 0)
+    no_signal = np.all(detrended == 0, axis=-1)
+    repeat_length = np.where(no_signal, np.nan, repeat_length)
+    snr = np.where(no_signal, np.nan, snr)
+
+    # Ladder peaks: maxima over a window of +/- half of each histogram's own repeat length. Rows sharing a
+    # window size are processed together, so a histogram's peaks do not depend on the rest of the batch.
+    rows = detrended.reshape(-1, n)
+    halves = np.maximum((np.where(np.isnan(repeat_length), max_period, repeat_length) / bin_width / 2).astype(int), 1).ravel()
+    peaks = np.zeros(rows.shape, dtype=bool)
+    for half in np.unique(halves):
+        group = halves == half
+        padded = np.pad(rows[group], [(0, 0), (half, half)], mode="constant", constant_values=-np.inf)
+        window_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * half + 1, axis=-1).max(axis=-1)
+        peaks[group] = (rows[group] == window_max) & (rows[group] > 0)
+    peaks = peaks.reshape(hists.shape)
+    # Maxima at the first and last bin are artefacts of the edge padding, not ladder peaks
+    peaks[..., 0] = False
+    peaks[..., -1] = False
+    return repeat_length, peaks, snr
+
+
+def vplot_repeat_length(vplots: np.ndarray, along: str = "midpoint", bin_locs: float = 10, bin_lens: float = 1,
+                        min_period: float = 100, max_period: float = 300, peak_fraction: float = 0.5):
+    """
+    Estimate the repeat length from every row or column of one or many v-plots.
+
+    Parameters
+    ----------
+    vplots : np.ndarray
+        V-plot arrays shaped (..., midpoint bins, fragment length bins), as returned by `vplot_data`.
+
+    along : str
+        'midpoint' analyses the positional periodicity of each fragment length bin;
+        'length' analyses the fragment length ladder at each midpoint bin.
+
+    bin_locs : float
+        Width of the midpoint bins in nucleotides.
+
+    bin_lens : float
+        Width of the fragment length bins in nucleotides.
+
+    min_period, max_period : float
+        Range of repeat lengths (nt) to consider.
+
+    peak_fraction : float
+        As in `estimate_repeat_length`.
+
+    Returns
+    -------
+    repeat_length, peaks, snr : np.ndarray
+        As in `estimate_repeat_length`, with one value per v-plot row (along='midpoint') or column (along='length').
+    """
+    vplots = np.asarray(vplots, dtype=float)
+    if along == "midpoint":
+        return estimate_repeat_length(np.swapaxes(vplots, -1, -2), bin_locs, min_period, max_period, peak_fraction)
+    elif along == "length":
+        return estimate_repeat_length(vplots, bin_lens, min_period, max_period, peak_fraction)
+    else:
+        raise ValueError("along must be 'midpoint' or 'length'")
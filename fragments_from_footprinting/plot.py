@@ -6,6 +6,7 @@ Includes functions for plotting the fragment length distribution, vplot, and cle
 # Import Modules 
 from .fragment_lengths import *
 from .params import max_fragment_length, distance_from_frag_center, fiber_midpoint, nrl, num_nucs, break_rate
+from .writer import save_array
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 from cycler import cycler
@@ -46,7 +47,7 @@ mpl.rcParams['font.sans-serif'] = 'Helvetica'
 # Set color-blindness friendly color palette
 mpl.rcParams['axes.prop_cycle'] = cycler(color=['#0072B2', '#D55E00', '#009E73', '#CC79A7','darkgrey', '#56B4E9','#E69F00','#F0E442']) # can add black: '#000000'
 
-def process_vplot_data(vplot_data: np.ndarray):
+def process_vplot_data(vplot_data: np.ndarray, writer = None):
     """
     Normalize vplot data and rotate the matrix for later plotting with plt.imshow()
     
@@ -55,6 +56,9 @@ def process_vplot_data(vplot_data: np.ndarray):
     vplot_data : np.ndarray
     2D Numpy array that contains the data to be plotted.
 
+    writer : AsyncWriter, default None
+    If given, the normalized array is saved in the background by this writer.
+
     Returns
     -------
     array_to_plot : np.ndarray
@@ -68,11 +72,11 @@ def process_vplot_data(vplot_data: np.ndarray):
     # Min-max normalize counts
     min_max_scaler = preprocessing.MinMaxScaler()
     array_to_plot = min_max_scaler.fit_transform(vplot_data_rotated)
-    np.save('intermed_data/vplot_norm.npy', array_to_plot) # This feature is new
+    save_array('intermed_data/vplot_norm.npy', array_to_plot, writer) # This feature is new
     return array_to_plot
 
 
-def plot_vplot(vplot_data: np.ndarray):
+def plot_vplot(vplot_data: np.ndarray, bands: tuple = None):
     """
     Generate a v_plot pdf that contains the associated cleavage probability. Count data is min-max normalized
     
@@ -81,6 +85,10 @@ def plot_vplot(vplot_data: np.ndarray):
     vplot_data : np.ndarray
     2D Numpy array that contains the data to be plotted.
 
+    bands : tuple of np.ndarray, default None
+    (estimate, lower, upper) from `vplot_confidence_bands`. If given, bins whose lower band lies above
+    the mean of their fragment length row are outlined, i.e. enrichment that is not explained by sampling noise.
+
     Returns
     -------
     Generates .pdf
@@ -110,6 +118,11 @@ def plot_vplot(vplot_data: np.ndarray):
 
     # Second Subplot: V-Plot
     im = ax[1].imshow(array_to_plot, cmap='seismic', extent = [min_range, max_range, 0, max_fragment_length])
+    if bands is not None:
+        estimate, lower, upper = bands
+        enriched = lower > estimate.mean(axis=0, keepdims=True)
+        ax[1].contour(np.flip(enriched.T).astype(float), levels=[0.5], colors='k', linewidths=0.5,
+                      extent = [min_range, max_range, max_fragment_length, 0])
     ax[1].set_xlabel('Distance from Fiber Midpoint to Fragment Center (nt)')
     ax[1].set_ylabel('Fragment \n Length (nt)')
     # Position and format color bar
@@ -125,7 +138,7 @@ def plot_vplot(vplot_data: np.ndarray):
     return
 
 
-def plot_fld(fld: np.ndarray = None):
+def plot_fld(fld: np.ndarray = None, bands: tuple = None):
     """
     Generate a fragment length distribution .pdf
     
@@ -135,6 +148,10 @@ def plot_fld(fld: np.ndarray = None):
     1D Numpy array that contains the fragment length resulting from all trials.
     Load saved 'frag_lens.npy' file if no fld is passed.
 
+    bands : tuple of np.ndarray, default None
+    (estimate, lower, upper) from `fld_confidence_bands`. If given, the bars are the estimate itself, binned
+    from 0 to max_fragment_length, and the band is overlaid as a shaded region; no file is loaded.
+
     Returns
     -------
     Generates .pdf
@@ -144,11 +161,20 @@ def plot_fld(fld: np.ndarray = None):
     subset to only the fragment lengths less than max considered.
     """
 
-    frag_lens_pre = np.load('intermed_data/frag_lens.npy') # TO DO write if statement if the file does not exist.
-    # Subset to relevant fragments
-    frag_lens = frag_lens_pre[frag_lens_pre < max_fragment_length]
     fig, ax = plt.subplots()
-    stored_histogram = sns.histplot(data=frag_lens, binwidth=10, stat= 'probability')
+    if bands is not None:
+        # Bars and band come from the same fragment set and share bin edges 0, w, 2w, ...
+        estimate, lower, upper = bands
+        bin_width = max_fragment_length / len(estimate)
+        edges = np.arange(len(estimate)) * bin_width
+        ax.bar(edges, estimate, width=bin_width, align='edge', alpha=0.75)
+        ax.fill_between(edges + bin_width / 2., lower, upper, step='mid', alpha=0.4, color='#D55E00', label=r'confidence band')
+        ax.set_ylabel('Probability')
+    else:
+        frag_lens_pre = np.load('intermed_data/frag_lens.npy') # TO DO write if statement if the file does not exist.
+        # Subset to relevant fragments
+        frag_lens = frag_lens_pre[frag_lens_pre < max_fragment_length]
+        stored_histogram = sns.histplot(data=frag_lens, binwidth=10, binrange=(0, max_fragment_length), stat= 'probability')
     plt.title('Fragment Length Distribution')
     plt.xlabel('Fragment Length (nt)')
     # plt.tight_layout()
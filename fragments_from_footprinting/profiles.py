@@ -0,0 +1,149 @@
+"""
+Library of cleavage probability profiles over the DNA wrapped around a nucleosome.
+
+A profile is `nuc_prob + (peak_prob - nuc_prob) * shape`, where the shape is 0 where the
+nucleosome protects most and 1 where it protects least:
+
+- 'dyad': linear ramp up to a peak at the dyad, `dyad_width` nucleotides wide (as in `make_dyad_array`);
+- 'gaussian': Gaussian peak at the dyad with standard deviation `sigma`;
+- 'sasa': solvent accessibility of the given SASA channels (see `damage_channels`), scaled to a maximum of 1;
+- 'custom': any `template` array of length `wrap_bp`.
+
+Shapes and single profiles are memoized with bounded LRU caches, so sweeps that revisit the same
+`dyad_width` or `nuc_prob` never rebuild a profile. Cached arrays are returned read-only.
+"""
+from .params import wrap, dyad_width
+from functools import lru_cache
+import numpy as np
+
+PROFILE_CACHE_SIZE = 256
+PROFILE_SHAPES = ("dyad", "gaussian", "sasa", "custom")
+
+
+def _read_only(array: np.ndarray):
+    array.setflags(write=False)
+    return array
+
+
+@lru_cache(maxsize=PROFILE_CACHE_SIZE)
+def dyad_ramp(dyad_width: int = dyad_width, wrap_bp: int = wrap):
+    """
+    Integer ramp 0, ..., 0, 1, 2, ..., k, ..., 2, 1, 0, ..., 0 of length `wrap_bp` with its peak k at the dyad.
+
+    The peak is `2k - 1` nucleotides wide with k = round(dyad_width / 2). When the number of zeros around
+    it is odd, the extra zero goes on the right.
+    """
+    steps = int(np.round(dyad_width / 2))
+    peak = np.concatenate([np.arange(1, steps + 1), np.arange(steps - 1, 0, -1)])
+    if len(peak) > wrap_bp:
+        raise ValueError("dyad_width is too large for wrap_bp")
+    num_zeros = wrap_bp - len(peak)
+    left = num_zeros // 2
+    return _read_only(np.concatenate([np.zeros(left, dtype=np.int64), peak, np.zeros(num_zeros - left, dtype=np.int64)]))
+
+
+@lru_cache(maxsize=PROFILE_CACHE_SIZE)
+def gaussian_shape(sigma: float = 10.0, wrap_bp: int = wrap):
+    """
+    Gaussian peak of height 1 centered on the dyad of a `wrap_bp` nucleotide nucleosome.
+    """
+    x = np.arange(wrap_bp) - (wrap_bp - 1) / 2.
+    return _read_only(np.exp(-0.5 * (x / sigma) ** 2))
+
+
+@lru_cache(maxsize=PROFILE_CACHE_SIZE)
+def sasa_shape(channels: tuple = ("I_iop1", "I_iop2", "J_iop1", "J_iop2"), wrap_bp: int = wrap):
+    """
+    Summed solvent accessibility of the given SASA channels ('strand_site'), scaled to a maximum of 1.
+    """
+    # Imported here because damage_channels depends on build_cleavage_probs, which uses this module
+    from .damage_channels import load_sasa
+    total = np.sum([load_sasa(channel.split("_")[1], channel.split("_")[0], wrap_bp) for channel in channels], axis=0)
+    return _read_only(total / np.max(total))
+
+
+def nucleosome_profiles(shape: str = "dyad", nuc_prob=0.0, peak_prob=1.0, dyad_width=dyad_width, sigma=10.0,
+                        channels: tuple = ("I_iop1", "I_iop2", "J_iop1", "J_iop2"), template: np.ndarray = None,
+                        wrap_bp: int = wrap):
+    """
+    Cleavage probability profiles over the wrapped DNA for many parameter values at once.
+
+    Parameters
+    ----------
+    shape : str
+        One of 'dyad', 'gaussian', 'sasa' or 'custom'.
+
+    nuc_prob : float or np.ndarray
+        Cleavage probability where the nucleosome protects most.
+
+    peak_prob : float or np.ndarray
+        Cleavage probability where the nucleosome protects least (the dyad for 'dyad' and 'gaussian').
+
+    dyad_width : int or np.ndarray
+        default: set in params.py
+        Number of nucleotides in the dyad peak ('dyad' only).
+
+    sigma : float or np.ndarray
+        Standard deviation of the peak in nucleotides ('gaussian' only).
+
+    channels : tuple of str
+        SASA channels whose accessibilities are summed ('sasa' only).
+
+    template : np.ndarray, default None
+        Shape of length `wrap_bp` ('custom' only).
+
+    wrap_bp : int
+        default: set in params.py
+        Number of base pairs wrapped around the nucleosome.
+
+    Returns
+    -------
+    profiles : np.ndarray
+        Array of shape (broadcast shape of the parameters) + (wrap_bp,).
+    """
+    if shape not in PROFILE_SHAPES:
+        raise ValueError("shape must be one of " + ", ".join(PROFILE_SHAPES))
+    width_param = dyad_width if shape == "dyad" else sigma if shape == "gaussian" else 0
+    nuc_prob, peak_prob, width_param = np.broadcast_arrays(np.asarray(nuc_prob, dtype=float), np.asarray(peak_prob, dtype=float),
+                                                           np.asarray(width_param))
+    batch_shape = nuc_prob.shape
+    nuc_prob, peak_prob, width_param = nuc_prob.ravel(), peak_prob.ravel(), width_param.ravel()
+    profiles = np.empty((len(nuc_prob), wrap_bp))
+    # Parameters sharing a width (or sigma) share one cached shape; amplitudes are applied with broadcasting
+    for value in np.unique(width_param):
+        rows = width_param == value
+        if shape == "dyad":
+            ramp = dyad_ramp(int(value), wrap_bp)
+            steps = max(int(ramp.max()), 1)
+            # Same arithmetic as np.linspace(0, peak - nuc, steps + 1): i * ((peak - nuc) / steps), ending exactly on peak - nuc
+            height = peak_prob[rows] - nuc_prob[rows]
+            diff = ramp * (height / steps)[:, None]
+            diff[:, ramp == steps] = height[:, None]
+            profiles[rows] = nuc_prob[rows, None] + diff
+            continue
+        elif shape == "gaussian":
+            unit = gaussian_shape(float(value), wrap_bp)
+        elif shape == "sasa":
+            unit = sasa_shape(tuple(channels), wrap_bp)
+        else:
+            unit = np.asarray(template, dtype=float)
+            if unit.shape != (wrap_bp,):
+                raise ValueError("template must have length wrap_bp")
+        profiles[rows] = nuc_prob[rows, None] + (peak_prob[rows] - nuc_prob[rows])[:, None] * unit
+    return profiles.reshape(batch_shape + (wrap_bp,))
+
+
+@lru_cache(maxsize=PROFILE_CACHE_SIZE)
+def nucleosome_profile(shape: str = "dyad", nuc_prob: float = 0.0, peak_prob: float = 1.0, dyad_width: int = dyad_width,
+                       sigma: float = 10.0, channels: tuple = ("I_iop1", "I_iop2", "J_iop1", "J_iop2"), wrap_bp: int = wrap):
+    """
+    Memoized single profile, as `nucleosome_profiles` with scalar parameters (custom templates are not cached).
+
+    Returns
+    -------
+    profile : np.ndarray
+        Read-only cleavage probability profile of length `wrap_bp`.
+    """
+    if shape == "custom":
+        raise ValueError("custom templates are not cached; use nucleosome_profiles")
+    return _read_only(nucleosome_profiles(shape, nuc_prob, peak_prob, dyad_width, sigma, channels, wrap_bp=wrap_bp))
@@ -0,0 +1,272 @@
+"""
+Score how well simulated FLDs and v-plots match an observed one.
+
+Every metric compares one observed histogram with a whole stack of simulated histograms
+(e.g. one per configuration of a parameter sweep) in a single vectorized call. Histograms
+with different binnings are brought to a common binning by summing adjacent bins (one
+binning must divide the other along every axis), and
+all of them are normalized to probability distributions before being compared.
+"""
+import numpy as np
+
+# Metrics for which a larger value means a better match
+HIGHER_IS_BETTER = ("correlation",)
+
+
+def rebin(hists: np.ndarray, shape: tuple):
+    """
+    Sum adjacent bins along the trailing axes.
+
+    Parameters
+    ----------
+    hists : np.ndarray
+        Histograms; the last `len(shape)` axes are binned.
+
+    shape : tuple of int
+        Number of bins wanted along each trailing axis. Each axis is coarsened by the integer
+        factor `old // new`, which must divide `old` exactly.
+
+    Returns
+    -------
+    rebinned : np.ndarray
+        Histograms with trailing axes of size `shape`.
+    """
+    hists = np.asarray(hists, dtype=float)
+    lead = hists.ndim - len(shape)
+    for axis, new in enumerate(shape, start=lead):
+        old = hists.shape[axis]
+        if new > old or old % new != 0:
+            raise ValueError("cannot rebin " + str(old) + " bins into " + str(new) + "; the number of bins must be a multiple")
+        factor = old // new
+        hists = hists.reshape(hists.shape[:axis] + (new, factor) + hists.shape[axis + 1:]).sum(axis=axis + 1)
+    return hists
+
+
+def _common_binning(observed: np.ndarray, simulated: np.ndarray):
+    """
+    Rebin an observed histogram and a stack of simulated ones to the coarser binning along every axis.
+
+    Returns
+    -------
+    observed, simulated : np.ndarray
+        Rebinned histograms; `simulated` has shape (num_simulations,) + observed.shape.
+
+    factors : np.ndarray
+        Factor by which each axis of `observed` was coarsened.
+    """
+    observed = np.asarray(observed, dtype=float)
+    simulated = np.asarray(simulated, dtype=float)
+    if simulated.ndim == observed.ndim:
+        simulated = simulated[None]
+    if simulated.ndim != observed.ndim + 1:
+        raise ValueError("simulated must be a stack of histograms with the dimensions of observed")
+    shape = tuple(min(o, s) for o, s in zip(observed.shape, simulated.shape[1:]))
+    factors = np.array(observed.shape) // np.array(shape)
+    return rebin(observed, shape), rebin(simulated, shape), factors
+
+
+def _distributions(observed: np.ndarray, simulated: np.ndarray):
+    """
+    Normalize histograms to sum to 1 over their bins, flattened to (bins,) and (num_simulations, bins).
+    """
+    observed = observed.ravel()
+    simulated = simulated.reshape(len(simulated), -1)
+    obs_total = observed.sum()
+    sim_totals = simulated.sum(axis=1, keepdims=True)
+    return (observed / obs_total if obs_total > 0 else observed,
+            np.divide(simulated, sim_totals, out=np.zeros_like(simulated), where=sim_totals > 0))
+
+
+def correlation(observed: np.ndarray, simulated: np.ndarray):
+    """
+    Pearson correlation between an observed histogram and each simulated histogram.
+
+    Parameters
+    ----------
+    observed : np.ndarray
+        FLD (1D) or v-plot (2D).
+
+    simulated : np.ndarray
+        Stack of simulated histograms, shaped (num_simulations,) + the shape of a histogram.
+
+    Returns
+    -------
+    scores : np.ndarray
+        Correlation coefficient for each simulation (NaN if either histogram is constant).
+    """
+    observed, simulated, _ = _common_binning(observed, simulated)
+    obs, sims = _distributions(observed, simulated)
+    obs = obs - obs.mean()
+    sims = sims - sims.mean(axis=1, keepdims=True)
+    denom = np.sqrt(np.sum(obs ** 2) * np.sum(sims ** 2, axis=1))
+    return np.divide(sims @ obs, denom, out=np.full(len(sims), np.nan), where=denom > 0)
+
+
+def kl_divergence(observed: np.ndarray, simulated: np.ndarray, eps: float = 1e-10):
+    """
+    Kullback-Leibler divergence KL(observed || simulated) for each simulated histogram.
+
+    Parameters
+    ----------
+    observed, simulated : np.ndarray
+        As in `correlation`.
+
+    eps : float
+        Probability added to every bin of the simulated distributions (which are then renormalized),
+        so that bins observed but never simulated give a large but finite divergence.
+
+    Returns
+    -------
+    scores : np.ndarray
+        Divergence in nats for each simulation.
+    """
+    observed, simulated, _ = _common_binning(observed, simulated)
+    obs, sims = _distributions(observed, simulated)
+    sims = (sims + eps) / (1 + eps * sims.shape[1])
+    ratio = np.log(np.divide(obs, sims, out=np.ones_like(sims), where=obs > 0))
+    return np.sum(obs * ratio, axis=1)
+
+
+def js_divergence(observed: np.ndarray, simulated: np.ndarray):
+    """
+    Jensen-Shannon divergence between an observed histogram and each simulated histogram.
+
+    Returns
+    -------
+    scores : np.ndarray
+        Divergence in nats (between 0 and log 2) for each simulation.
+    """
+    observed, simulated, _ = _common_binning(observed, simulated)
+    obs, sims = _distributions(observed, simulated)
+    mixture = 0.5 * (obs + sims)
+
+    def _kl_to_mixture(p):
+        return np.sum(p * np.log(np.divide(p, mixture, out=np.ones_like(mixture), where=p > 0)), axis=-1)
+
+    return 0.5 * _kl_to_mixture(np.broadcast_to(obs, sims.shape)) + 0.5 * _kl_to_mixture(sims)
+
+
+def emd_1d(observed: np.ndarray, simulated: np.ndarray, bin_width: float = 1):
+    """
+    Earth mover's distance between an observed FLD and each simulated FLD.
+
+    In one dimension the EMD is the area between the cumulative distributions.
+
+    Parameters
+    ----------
+    observed, simulated : np.ndarray
+        FLDs, as in `correlation`.
+
+    bin_width : float
+        Width in nucleotides of the bins of `observed`.
+
+    Returns
+    -------
+    scores : np.ndarray
+        Distance in nucleotides for each simulation.
+    """
+    observed, simulated, factors = _common_binning(observed, simulated)
+    obs, sims = _distributions(observed, simulated)
+    return np.sum(np.abs(np.cumsum(sims, axis=1) - np.cumsum(obs)), axis=1) * bin_width * factors[0]
+
+
+def emd_2d(observed: np.ndarray, simulated: np.ndarray, bin_widths: tuple = (10, 1), num_projections: int = 32):
+    """
+    Sliced earth mover's distance between an observed v-plot and each simulated v-plot.
+
+    The exact 2D EMD needs a transport problem per pair. Instead the bin centers are projected
+    onto `num_projections` evenly spaced directions, where the EMD is the 1D area between
+    cumulative distributions, and the 1D distances are averaged over directions.
+
+    Parameters
+    ----------
+    observed, simulated : np.ndarray
+        V-plots (midpoint bins, fragment length bins), as in `correlation`.
+
+    bin_widths : tuple of float
+        Width in nucleotides of the midpoint and fragment length bins of `observed` (bin_locs, bin_lens).
+
+    num_projections : int
+        Number of projection directions.
+
+    Returns
+    -------
+    scores : np.ndarray
+        Sliced distance in nucleotides for each simulation.
+    """
+    observed, simulated, factors = _common_binning(observed, simulated)
+    obs, sims = _distributions(observed, simulated)
+    widths = np.asarray(bin_widths, dtype=float) * factors
+    rows, cols = np.meshgrid(np.arange(observed.shape[0]) * widths[0], np.arange(observed.shape[1]) * widths[1], indexing="ij")
+    centers = np.stack([rows.ravel(), cols.ravel()], axis=1)
+    angles = np.arange(num_projections) * np.pi / num_projections
+    scores = np.zeros(len(sims))
+    for direction in np.stack([np.cos(angles), np.sin(angles)], axis=1):
+        projected = centers @ direction
+        order = np.argsort(projected, kind="stable")
+        gaps = np.diff(projected[order])
+        cdf_diff = np.cumsum(sims[:, order] - obs[order], axis=1)[:, :-1]
+        scores += np.abs(cdf_diff) @ gaps
+    return scores / num_projections
+
+
+def score(observed: np.ndarray, simulated: np.ndarray, metric: str = "js", **kwargs):
+    """
+    Compare an observed histogram with each simulated histogram using one metric.
+
+    Parameters
+    ----------
+    observed, simulated : np.ndarray
+        As in `correlation`.
+
+    metric : str
+        'correlation', 'kl', 'js' or 'emd' (1D EMD for FLDs, sliced 2D EMD for v-plots).
+
+    **kwargs :
+        Passed on to the metric, e.g. `bin_width` or `bin_widths` for 'emd'.
+
+    Returns
+    -------
+    scores : np.ndarray
+        One score per simulation.
+    """
+    if metric == "correlation":
+        return correlation(observed, simulated)
+    elif metric == "kl":
+        return kl_divergence(observed, simulated, **kwargs)
+    elif metric == "js":
+        return js_divergence(observed, simulated)
+    elif metric == "emd":
+        return (emd_1d if np.ndim(observed) == 1 else emd_2d)(observed, simulated, **kwargs)
+    else:
+        raise ValueError("metric must be 'correlation', 'kl', 'js' or 'emd'")
+
+
+def rank_sweep(observed: np.ndarray, simulated: np.ndarray, metric: str = "js", **kwargs):
+    """
+    Rank the configurations of a sweep by how well they match an observed FLD or v-plot.
+
+    Parameters
+    ----------
+    observed : np.ndarray
+        Observed FLD or v-plot.
+
+    simulated : np.ndarray
+        Simulated histograms, one per configuration, shaped (num_configs,) + the shape of a histogram.
+        The binning may differ from the observed one as long as, along every axis, one number of bins
+        is a multiple of the other; otherwise a ValueError is raised.
+
+    metric : str
+        As in `score`.
+
+    Returns
+    -------
+    ranking : np.ndarray
+        Configuration indices from best to worst match.
+
+    scores : np.ndarray
+        Score of each configuration (in the original order).
+    """
+    scores = score(observed, simulated, metric, **kwargs)
+    keyed = -scores if metric in HIGHER_IS_BETTER else scores
+    return np.argsort(np.where(np.isnan(keyed), np.inf, keyed), kind="stable"), scores
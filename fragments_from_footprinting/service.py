@@ -0,0 +1,336 @@
+"""
+Local simulation server that keeps worker processes warm between requests.
+
+Starting a fresh interpreter for every FLD or v-plot pays the import, params.csv read and
+worker start-up cost each time. The server does this once and then answers simulation
+requests, given as a configuration plus a seed, over HTTP on the loopback interface:
+
+    python -m fragments_from_footprinting.service --port 8765 --workers 4
+
+Identical requests that are in flight at the same time are simulated once, and repeated
+requests are answered from a bounded in-memory cache. Results are returned as an .npz
+archive holding the FLD and v-plot arrays; `request_simulation` is a matching client.
+"""
+from .params import max_fragment_length, distance_from_frag_center, break_rate, num_trials, link_len, wrap, dyad_bool, dyad_width, num_nucs
+from .build_cleavage_probs import generate_cleav_prob
+from .fragment_lengths import simulate_fragment_set
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import hashlib
+import http.client
+import io
+import json
+import multiprocessing
+import os
+import threading
+import numpy as np
+
+# Configuration keys accepted by the server and their defaults
+DEFAULT_CONFIG = {"link_prob": 1.0, "nuc_prob": 0.0, "linker_length": link_len, "wrap_bp": wrap, "dyad_bool": dyad_bool,
+                  "dyad_width": dyad_width, "num_nucs": num_nucs, "trials": num_trials, "break_rate": break_rate, "xmin": 0,
+                  "seed": None, "max_frag": max_fragment_length, "dist_from_center": distance_from_frag_center,
+                  "bin_lens": 1, "bin_locs": 10}
+
+
+def normalize_config(config: dict):
+    """
+    Fill in defaults and check a simulation request.
+
+    Parameters
+    ----------
+    config : dict
+        Any subset of the keys of `DEFAULT_CONFIG`. 'seed' is required so that results can be cached;
+        'nuc_prob' may be a number or a list with one value per wrapped nucleotide.
+
+    Returns
+    -------
+    config : dict
+        Complete configuration.
+
+    key : str
+        Hex SHA-256 digest identifying the request.
+    """
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError("unknown configuration keys: " + ", ".join(sorted(unknown)))
+    if config.get("seed") is None:
+        raise ValueError("a seed is required")
+    config = {**DEFAULT_CONFIG, **config}
+    config["nuc_prob"] = [float(p) for p in config["nuc_prob"]] if isinstance(config["nuc_prob"], (list, tuple)) else float(config["nuc_prob"])
+    config["link_prob"] = float(config["link_prob"])
+    for name in DEFAULT_CONFIG:
+        if name not in ("link_prob", "nuc_prob"):
+            config[name] = int(config[name])
+    key = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+    return config, key
+
+
+def run_config(config: dict):
+    """
+    Simulate one normalized configuration.
+
+    Returns
+    -------
+    payload : bytes
+        .npz archive with the arrays 'fld' and 'vplot' and the scalar 'num_trials'.
+    """
+    nuc_prob = np.asarray(config["nuc_prob"]) if isinstance(config["nuc_prob"], list) else config["nuc_prob"]
+    cleavage_prob = generate_cleav_prob(link_prob = config["link_prob"], nuc_prob = nuc_prob, linker_length = config["linker_length"],
+                                        wrap_bp = config["wrap_bp"], dyad_bool = config["dyad_bool"], dyad_width = config["dyad_width"],
+                                        num_nucs = config["num_nucs"], save_data = 0)
+    fragment_set = simulate_fragment_set(cleavage_prob, trials = config["trials"], break_rate = config["break_rate"],
+                                         xmin = config["xmin"], seed = config["seed"])
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, num_trials = fragment_set.num_trials,
+                        fld = fragment_set.to_fld(config["max_frag"], config["bin_lens"]),
+                        vplot = fragment_set.to_vplot(config["max_frag"], config["dist_from_center"], config["bin_lens"], config["bin_locs"]))
+    return buffer.getvalue()
+
+
+_warm_barrier = None
+
+
+def _init_worker(barrier):
+    """
+    Worker process initializer: keep the barrier shared by the warm-up jobs.
+    """
+    global _warm_barrier
+    _warm_barrier = barrier
+
+
+def _warm_up(config: dict):
+    """
+    Run a tiny simulation, then wait until every worker has done the same so that each one gets exactly one warm-up job.
+    """
+    run_config(config)
+    _warm_barrier.wait()
+    return os.getpid()
+
+
+def decode_result(payload: bytes):
+    """
+    Unpack a result returned by the server into a dict of arrays ('fld', 'vplot', 'num_trials').
+    """
+    with np.load(io.BytesIO(payload)) as data:
+        return {key: data[key] for key in data.files}
+
+
+class SimulationService:
+    """
+    Warm worker pool with coalescing of in-flight requests and an LRU cache of results.
+
+    Parameters
+    ----------
+    max_workers : int, default None
+        Number of worker processes; defaults to the number of CPUs. All of them are started and
+        warmed up before the service accepts requests.
+
+    cache_size : int
+        Maximum number of results kept in memory.
+    """
+
+    def __init__(self, max_workers: int = None, cache_size: int = 128):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        context = multiprocessing.get_context()
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context, initializer=_init_worker,
+                                            initargs=(context.Barrier(self.max_workers),))
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.stats = {"hits": 0, "coalesced": 0, "simulated": 0}
+        # Reentrant, because a future that is already done runs its callback in the submitting thread
+        self.lock = threading.RLock()
+        # Start every worker (and its imports) now rather than on the first requests
+        warm_config, _ = normalize_config({"trials": 1, "seed": 0})
+        warm_ups = [self.executor.submit(_warm_up, warm_config) for _ in range(self.max_workers)]
+        self.worker_pids = {future.result() for future in warm_ups}
+
+    def submit(self, config: dict):
+        """
+        Result of a simulation request.
+
+        Returns
+        -------
+        payload : bytes
+            Encoded result (see `run_config`).
+
+        source : str
+            'hit' if served from the cache, 'coalesced' if it joined an identical request in flight, else 'simulated'.
+        """
+        config, key = normalize_config(config)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return self.cache[key], "hit"
+            if key in self.in_flight:
+                future, source = self.in_flight[key], "coalesced"
+            else:
+                future, source = self.executor.submit(run_config, config), "simulated"
+                self.in_flight[key] = future
+                future.add_done_callback(lambda done, key=key: self._store(key, done))
+            self.stats[source] += 1
+        return future.result(), source
+
+    def _store(self, key: str, future):
+        """
+        Move a finished request from the in-flight table to the cache.
+        """
+        with self.lock:
+            self.in_flight.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            self.cache[key] = future.result()
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    POST /simulate with a JSON configuration returns an .npz result; GET /stats returns cache statistics.
+    """
+
+    def _reply(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_json(self, status: int, obj: dict):
+        self._reply(status, json.dumps(obj).encode(), "application/json")
+
+    def do_GET(self):
+        if self.path != "/stats":
+            return self._reply_json(404, {"error": "not found"})
+        service = self.server.service
+        with service.lock:
+            stats = {**service.stats, "cached": len(service.cache), "in_flight": len(service.in_flight)}
+        self._reply_json(200, stats)
+
+    def do_POST(self):
+        if self.path != "/simulate":
+            return self._reply_json(404, {"error": "not found"})
+        try:
+            config = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            payload, source = self.server.service.submit(config)
+        except (ValueError, TypeError) as err:
+            return self._reply_json(400, {"error": str(err)})
+        except Exception as err:
+            # e.g. BrokenProcessPool if a worker died
+            return self._reply_json(500, {"error": type(err).__name__ + ": " + str(err)})
+        self._reply(200, payload, "application/octet-stream", {"X-Cache": source})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SimulationServer(ThreadingHTTPServer):
+    """
+    HTTP server bound to the loopback interface. Each connection is handled in its own thread,
+    while the simulations themselves run in the worker processes of `service`.
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int = 8765, max_workers: int = None, cache_size: int = 128, host: str = "127.0.0.1"):
+        if host not in ("127.0.0.1", "localhost", "::1"):
+            raise ValueError("the simulation server only listens on the loopback interface")
+        self.service = SimulationService(max_workers, cache_size)
+        super().__init__((host, port), _Handler)
+
+    def server_close(self):
+        super().server_close()
+        self.service.shutdown()
+
+
+def start_server(port: int = 0, max_workers: int = None, cache_size: int = 128):
+    """
+    Start a server in a background thread, e.g. from a notebook.
+
+    Parameters
+    ----------
+    port : int
+        Port to listen on; 0 picks a free port (see `server.server_address`).
+
+    max_workers, cache_size :
+        As in `SimulationService`.
+
+    Returns
+    -------
+    server : SimulationServer
+        Running server. Stop it with `server.shutdown(); server.server_close()`.
+    """
+    server = SimulationServer(port, max_workers, cache_size)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def request_simulation(config: dict, port: int = 8765, host: str = "127.0.0.1", timeout: float = None):
+    """
+    Ask a running server for a simulation.
+
+    Parameters
+    ----------
+    config : dict
+        Simulation request; see `normalize_config`.
+
+    port, host :
+        Address of the server.
+
+    timeout : float, default None
+        Seconds to wait for the result.
+
+    Returns
+    -------
+    result : dict
+        'fld', 'vplot' and 'num_trials' arrays.
+
+    Raises
+    ------
+    ValueError
+        If the server rejected the request.
+
+    RuntimeError
+        If the simulation failed on the server.
+    """
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request("POST", "/simulate", body=json.dumps(config), headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        body = response.read()
+    finally:
+        connection.close()
+    if response.status != 200:
+        error = json.loads(body).get("error", "request failed with status " + str(response.status))
+        raise RuntimeError(error) if response.status >= 500 else ValueError(error)
+    return decode_result(body)
+
+
+def _main(argv: list = None):
+    """
+    Command line entry point: run a server until interrupted.
+    """
+    parser = argparse.ArgumentParser(prog="python -m fragments_from_footprinting.service")
+    parser.add_argument("--port", type=int, default=8765, help="port on 127.0.0.1 to listen on")
+    parser.add_argument("--workers", type=int, default=None, help="number of warm worker processes")
+    parser.add_argument("--cache-size", type=int, default=128, help="number of results kept in memory")
+    args = parser.parse_args(argv)
+    server = SimulationServer(args.port, args.workers, args.cache_size)
+    print("serving simulations on http://127.0.0.1:" + str(server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    _main()
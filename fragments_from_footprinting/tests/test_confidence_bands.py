@@ -0,0 +1,36 @@
+import sys
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+
+def test_block_histograms_sum_to_totals():
+    """
+    Test that the per-block histograms add up to the FLD and v-plot of the full fragment set.
+    """
+    example_cp = ff.generate_cleav_prob()
+    fs = ff.simulate_fragment_set(example_cp, trials = 40, seed = 0)
+    assert np.array_equal(ff.block_flds(fs, num_blocks = 8, max_frag = 500).sum(axis=0), fs.to_fld(max_frag = 500))
+    vplot_blocks = ff.block_vplots(fs, num_blocks = 8, max_frag = 300, dist_from_center = 500, bin_lens = 3, bin_locs = 20)
+    assert vplot_blocks.shape == (8, 50, 100)
+    assert np.array_equal(vplot_blocks.sum(axis=0), fs.to_vplot(max_frag = 300, dist_from_center = 500, bin_lens = 3, bin_locs = 20))
+
+@pytest.mark.parametrize("method", ["bootstrap", "jackknife"])
+def test_fld_confidence_bands(method):
+    """
+    Test that the bands bracket the point estimate and narrow as more trials are simulated.
+    """
+    example_cp = ff.generate_cleav_prob()
+    widths = []
+    for trials in [40, 400]:
+        fs = ff.simulate_fragment_set(example_cp, trials = trials, seed = 1)
+        estimate, lower, upper = ff.fld_confidence_bands(fs, method = method, num_blocks = 20, seed = 2)
+        assert np.isclose(estimate.sum(), 1.)
+        assert np.all(lower <= estimate + 1e-12) and np.all(estimate <= upper + 1e-12)
+        widths.append(np.sum(upper - lower))
+    assert widths[1] < widths[0]
+    if method == "bootstrap":
+        # A small memory budget splits the bins into many chunks without changing the band
+        blocks = ff.block_flds(fs, num_blocks = 20)
+        chunked = ff.bootstrap_bands(blocks, num_resamples = 200, seed = 3, max_values = 200 * 7)
+        whole = ff.bootstrap_bands(blocks, num_resamples = 200, seed = 3)
+        assert all(np.array_equal(a, b) for a, b in zip(chunked, whole))
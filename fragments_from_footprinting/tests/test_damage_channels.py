@@ -0,0 +1,32 @@
+import sys
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+
+def test_sasa_channel_probs():
+    """
+    Test that the SASA channels cover the wrapped DNA and add up to the linker probability in the linker.
+    """
+    channels, channel_probs = ff.sasa_channel_probs(link_prob = 0.5)
+    assert len(channels) == 10
+    assert channel_probs.shape == (10, len(ff.generate_cleav_prob(save_data = 0)))
+    total = channel_probs.sum(axis=0)
+    assert np.allclose(total[:ff.link_len], 0.5)
+    assert np.all(total[ff.link_len:ff.link_len + ff.wrap] < 0.5)
+    assert np.array_equal(ff.load_sasa("iop1", "J")[:146], ff.load_sasa("iop1", "J", wrap_bp = 146))
+
+def test_channels_from_a_single_pass():
+    """
+    Test that labelling breaks with channels leaves the fragments unchanged and splits the ends
+    between channels in proportion to their probabilities.
+    """
+    example_cp = ff.generate_cleav_prob(nuc_prob = 0.2, save_data = 0)
+    channel_probs = np.array([0.3 * example_cp, 0.7 * example_cp])
+    plain = ff.simulate_fragment_set(example_cp, trials = 50, seed = 4)
+    labelled = ff.simulate_fragment_set(example_cp, trials = 50, seed = 4, channel_probs = channel_probs)
+    assert np.array_equal(plain.frag_lens, labelled.frag_lens)
+    flds = ff.channel_flds(labelled, 2)
+    assert np.array_equal(flds.sum(axis=0), 2 * labelled.to_fld())
+    assert abs(flds[0].sum() / flds.sum() - 0.3) < 0.02
+    vplots = ff.channel_vplots(labelled, 2, max_frag = 300, dist_from_center = 500)
+    assert np.array_equal(vplots.sum(axis=0), 2 * labelled.to_vplot(max_frag = 300, dist_from_center = 500))
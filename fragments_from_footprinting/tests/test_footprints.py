@@ -0,0 +1,68 @@
+import sys
+import time
+import tracemalloc
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+
+def test_compose_regular_nucleosome_array():
+    """
+    Test that composing the nucleosomes of the regular fiber reproduces generate_cleav_prob,
+    with either a uniform or a per-position protection profile.
+    """
+    example_cp = ff.generate_cleav_prob(nuc_prob = 0.2)
+    starts, ends = ff.nucleosome_intervals()
+    uniform = ff.compose_footprints(len(example_cp), starts, ends, profiles = [0.8])
+    profiled = ff.compose_footprints(len(example_cp), starts, ends, profiles = [np.repeat(0.8, ff.wrap)], rule = "multiply")
+    assert np.allclose(uniform, example_cp)
+    assert np.allclose(profiled, example_cp)
+
+@pytest.mark.parametrize("chunk_size", [7, 1 << 22])
+def test_overlap_rules(chunk_size):
+    """
+    Test max and multiplicative protection of overlapping footprints against a per-position reference.
+    """
+    rng = np.random.default_rng(0)
+    length = 500
+    starts = rng.integers(-20, length, 200)
+    ends = starts + rng.integers(1, 30, 200)
+    profile_ids = rng.integers(0, 2, 200)
+    ends[profile_ids == 1] = starts[profile_ids == 1] + 10
+    occupancy = rng.random(200)
+    profiles = [0.9, np.linspace(0., 1., 10)]
+    max_protection = np.zeros(length)
+    free = np.ones(length)
+    for start, end, pid, occ in zip(starts, ends, profile_ids, occupancy):
+        protection = occ * np.broadcast_to(profiles[pid], (end - start,))
+        for pos, value in zip(range(start, end), protection):
+            if 0 <= pos < length:
+                max_protection[pos] = max(max_protection[pos], value)
+                free[pos] *= 1 - value
+    kwargs = dict(profile_ids = profile_ids, occupancy = occupancy, base_prob = 0.5, chunk_size = chunk_size)
+    assert np.allclose(ff.compose_footprints(length, starts, ends, profiles, rule = "max", **kwargs), 0.5 * (1 - max_protection))
+    assert np.allclose(ff.compose_footprints(length, starts, ends, profiles, rule = "multiply", **kwargs), 0.5 * free)
+
+def test_compose_scales_with_length_not_chunks():
+    """
+    Test that composing footprints holds only a few arrays of the fiber's length, and that splitting the profiled
+    footprints into many chunks does not make each chunk pay for the whole fiber.
+    """
+    rng = np.random.default_rng(0)
+    length = 1 << 22
+    starts = rng.integers(0, length, 20000)
+    profile_ids = rng.integers(0, 2, 20000)
+    ends = starts + np.where(profile_ids == 1, ff.wrap, rng.integers(10, 50, 20000))
+    occupancy = rng.random(20000)
+    profiles = [0.9, np.linspace(0., 1., ff.wrap)]
+    for rule in ["max", "multiply"]:
+        tracemalloc.start()
+        ff.compose_footprints(length, starts, ends, profiles, profile_ids, occupancy, rule = rule)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak < 24 * length
+    times = []
+    for chunk_size in [1 << 22, 1 << 12]:
+        start = time.perf_counter()
+        ff.compose_footprints(length, starts, ends, profiles, profile_ids, occupancy, rule = "multiply", chunk_size = chunk_size)
+        times.append(time.perf_counter() - start)
+    assert times[1] < 5 * times[0] + 0.5
@@ -60,3 +60,98 @@ def test_vplot_data():
     expected_cols = max_frag_ / bin_lens_
     observed_shape = np.shape(vplot_arr)
     assert (expected_rows == observed_shape[0]) & (expected_cols == observed_shape[1])
+
+def test_resimulate_fragment_set():
+    """
+    Test that incremental re-simulation with common random numbers reproduces a full simulation
+    of the new cleavage array while only recomputing the affected trials.
+    """
+    old_cp = ff.generate_cleav_prob()
+    new_cp = old_cp.copy()
+    # Move cleavage probability from part of the first linker to part of the first nucleosome, keeping the total fixed
+    new_cp[0:20] = 0.5
+    new_cp[ff.link_len:ff.link_len + 20] = 0.5
+    crn = ff.draw_common_random_numbers([old_cp, new_cp], trials = 50, seed = 0)
+    old_fs = ff.simulate_fragment_set(old_cp, common_random_numbers = crn)
+    full_fs = ff.simulate_fragment_set(new_cp, common_random_numbers = crn)
+    incremental_fs, affected_trials = ff.resimulate_fragment_set(old_fs, old_cp, new_cp, crn)
+    assert 0 < len(affected_trials) < 50
+    for fs in [full_fs, incremental_fs]:
+        order = np.lexsort((fs.midpoints, fs.trial_ids, fs.frag_lens))
+        fs.frag_lens, fs.midpoints, fs.trial_ids = fs.frag_lens[order], fs.midpoints[order], fs.trial_ids[order]
+    assert np.array_equal(full_fs.frag_lens, incremental_fs.frag_lens)
+    assert np.array_equal(full_fs.midpoints, incremental_fs.midpoints)
+    assert np.array_equal(full_fs.trial_ids, incremental_fs.trial_ids)
+
+    # Ensemble runs are resimulated on each trial's own fiber
+    ensemble = ff.sample_ensemble(50, occupancy = 0.8, fuzziness = 10, seed = 1)
+    old_fs = ff.simulate_fragment_set(old_cp, common_random_numbers = crn, ensemble = ensemble)
+    full_fs = ff.simulate_fragment_set(new_cp, common_random_numbers = crn, ensemble = ensemble)
+    incremental_fs, affected_trials = ff.resimulate_fragment_set(old_fs, old_cp, new_cp, crn, ensemble = ensemble)
+    assert np.array_equal(np.sort(full_fs.frag_lens), np.sort(incremental_fs.frag_lens))
+    assert np.array_equal(full_fs.to_vplot(), incremental_fs.to_vplot())
+    with pytest.raises(ValueError):
+        labelled = ff.simulate_fragment_set(old_cp, common_random_numbers = crn, channel_probs = old_cp[None])
+        ff.resimulate_fragment_set(labelled, old_cp, new_cp, crn)
+
+def test_common_random_numbers_reduce_paired_variance():
+    """
+    Test that common random numbers cut the variance of a per-trial FLD difference between two profiles well
+    below that of independent runs, while each run keeps the distribution of an ordinary simulation.
+    """
+    trials = 2000
+    def per_trial_flds(fs):
+        short = fs.frag_lens < 1000
+        return np.bincount(fs.trial_ids[short] * 20 + fs.frag_lens[short] // 50, minlength = trials * 20).reshape(trials, 20)
+    base_cp = ff.generate_cleav_prob(nuc_prob = 0.)
+    for nuc_prob, min_reduction in [(0.05, 3.5), (0.01, 10.)]:
+        new_cp = ff.generate_cleav_prob(nuc_prob = nuc_prob)
+        crn = ff.draw_common_random_numbers([base_cp, new_cp], trials = trials, seed = 0)
+        other = ff.draw_common_random_numbers([base_cp, new_cp], trials = trials, seed = 1)
+        base = per_trial_flds(ff.simulate_fragment_set(base_cp, common_random_numbers = crn))
+        paired = base - per_trial_flds(ff.simulate_fragment_set(new_cp, common_random_numbers = crn))
+        independent = base - per_trial_flds(ff.simulate_fragment_set(new_cp, common_random_numbers = other))
+        assert independent.var(axis=0).sum() > min_reduction * paired.var(axis=0).sum()
+    direct = ff.simulate_fragment_set(new_cp, trials = trials, seed = 2)
+    shared_fld, shared_var = ff.weighted_fld(ff.simulate_fragment_set(new_cp, common_random_numbers = crn), bin_lens = 100)
+    direct_fld, direct_var = ff.weighted_fld(direct, bin_lens = 100)
+    assert np.all(np.abs(shared_fld - direct_fld) < 4 * np.sqrt(shared_var + direct_var) + 1)
+
+def test_circular_fiber():
+    """
+    Test that on a circular unit cell the fragments of each trial tile the whole circle, that the
+    FLD of a cell longer than max_frag matches that of the full linear fiber, and that shorter cells are rejected.
+    """
+    cell = ff.generate_cleav_prob(num_nucs = 6, circular = True)
+    assert len(cell) == 6 * ff.nrl
+    assert len(cell) > ff.max_fragment_length
+    fs = ff.simulate_fragment_set(cell, trials = 2000, seed = 0, circular = True)
+    lens_per_trial = np.bincount(fs.trial_ids, weights = fs.frag_lens, minlength = 2000)
+    assert np.all((lens_per_trial == len(cell)) | (lens_per_trial == 0))
+    assert np.all(np.abs(fs.relative_mid) <= len(cell) / 2)
+    linear = ff.simulate_fragment_set(ff.generate_cleav_prob(), trials = 1000, seed = 1)
+    circular_fld = fs.to_fld(bin_lens = 50)
+    linear_fld = linear.to_fld(bin_lens = 50)
+    assert np.corrcoef(circular_fld, linear_fld)[0, 1] > 0.99
+    vplot_arr = fs.to_vplot(max_frag = 300, dist_from_center = 500, bin_lens = 3, bin_locs = 20)
+    assert vplot_arr.shape == (50, 100)
+    short_cell = ff.simulate_fragment_set(ff.generate_cleav_prob(num_nucs = 3, circular = True), trials = 10, seed = 0, circular = True)
+    with pytest.raises(ValueError):
+        short_cell.to_fld()
+    with pytest.raises(ValueError):
+        short_cell.to_vplot()
+
+def test_windowed_simulation_matches_full_fiber_vplot():
+    """
+    Test that simulating only the v-plot window gives the same v-plot statistics as the full fiber.
+    """
+    example_cp = ff.generate_cleav_prob()
+    vplot_kwargs = dict(max_frag = 300, dist_from_center = 500, bin_lens = 10, bin_locs = 50)
+    window = ff.vplot_window(len(example_cp), max_frag = 300, dist_from_center = 500)
+    assert window[1] - window[0] < len(example_cp)
+    full = ff.simulate_fragment_set(example_cp, trials = 1000, seed = 0).to_vplot(**vplot_kwargs)
+    windowed_fs = ff.simulate_fragment_set(example_cp, trials = 1000, seed = 1, window = window)
+    windowed = windowed_fs.to_vplot(**vplot_kwargs)
+    assert np.min(windowed_fs.midpoints) >= window[0] and np.max(windowed_fs.midpoints) < window[1]
+    assert abs(windowed.sum() - full.sum()) < 4 * np.sqrt(full.sum())
+    assert np.corrcoef(windowed.ravel(), full.ravel())[0, 1] > 0.95
@@ -0,0 +1,52 @@
+import sys
+import pytest
+import numpy as np
+import random
+import fragments_from_footprinting as ff
+
+def test_fragments_from_attempts_matches_get_frag_lens():
+    """
+    Test that the vectorized fragment extraction reproduces get_frag_lens for a single trial,
+    including duplicate attempts at the same location.
+    """
+    example_cp = ff.generate_cleav_prob()
+    nts = len(example_cp)
+    rng = np.random.default_rng(3)
+    locs = rng.integers(0, nts, size=(1, 500))
+    locs[0, 1] = locs[0, 0]
+    uniforms = rng.random((1, 500))
+    frags, mids = ff.get_frag_lens(pot_cut_locs = locs[0], cut_bool = uniforms[0] < example_cp[locs[0]])
+    frags_vec, mids_vec, trial_ids = ff.fragment_lengths._fragments_from_attempts(locs, uniforms, example_cp[locs], nts)
+    assert np.array_equal(frags, frags_vec)
+    assert np.array_equal(mids, mids_vec)
+    assert np.all(trial_ids == 0)
+
+def test_fragment_set_is_compact():
+    """
+    Test that a FragmentSet uses less than a third of the memory of the float64 arrays and dataframe
+    it replaces, and that length cut-offs are views rather than copies.
+    """
+    example_cp = ff.generate_cleav_prob()
+    fs = ff.simulate_fragment_set(example_cp, trials = 20, seed = 0)
+    frag_lens, midpts = fs.frag_lens.astype(float), fs.midpoints.astype(float)
+    legacy_nbytes = frag_lens.nbytes + midpts.nbytes + ff.frag_mid_df(frag_lens, midpts).memory_usage(index=False).sum()
+    assert 3 * fs.nbytes < legacy_nbytes
+    short = fs.shorter_than(300)
+    assert np.shares_memory(short.frag_lens, fs.frag_lens)
+    assert np.max(short.frag_lens) < 300
+    assert np.array_equal(np.sort(fs.trial_ids)[[0, -1]], [0, 19])
+
+def test_to_vplot():
+    """
+    Test that FragmentSet.to_vplot bins the same fragments into the same bins as vplot_data on a dataframe.
+    """
+    example_cp = ff.generate_cleav_prob()
+    fs = ff.simulate_fragment_set(example_cp, trials = 200, seed = 1)
+    fm_df = ff.frag_mid_df(fs.frag_lens, fs.midpoints)
+    for max_frag, bin_lens, bin_locs in [(300, 3, 20), (600, 1, 10), (1000, 10, 25)]:
+        vplot_arr = ff.vplot_data(fs, max_frag = max_frag, dist_from_center = 500, bin_lens = bin_lens, bin_locs = bin_locs, save_data = 0)
+        expected = ff.vplot_data(fm_df, max_frag = max_frag, dist_from_center = 500, bin_lens = bin_lens, bin_locs = bin_locs, save_data = 0)
+        assert np.array_equal(vplot_arr, expected)
+        assert np.array_equal(vplot_arr, ff.vplot_data(fs.to_dataframe(), max_frag = max_frag, dist_from_center = 500,
+                                                       bin_lens = bin_lens, bin_locs = bin_locs, save_data = 0))
+    assert fs.to_fld(max_frag = 300).sum() == np.sum(fs.frag_lens < 300)
@@ -0,0 +1,66 @@
+import sys
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+
+def test_fragment_weights_are_one_at_the_target_rate():
+    """
+    Test that the likelihood ratio of any fragment is 1 when the proposal and target rates are equal.
+    """
+    example_cp = ff.generate_cleav_prob()
+    breaks_to_try = ff.get_breaks_to_try(example_cp)[0]
+    tables = ff.likelihood_ratio_tables(example_cp, breaks_to_try, breaks_to_try)
+    cut = np.nonzero(example_cp > 0)[0]
+    assert np.allclose(ff.fragment_weights(cut[[0, 5, 100]], cut[[10, 200, 700]] - cut[[0, 5, 100]], tables), 1.)
+
+def test_fragment_log_probs_match_inclusion_exclusion():
+    """
+    Test the numerically stable fragment probabilities against the inclusion-exclusion formula evaluated directly.
+    """
+    example_cp = ff.generate_cleav_prob()
+    breaks_to_try = ff.get_breaks_to_try(example_cp, breaks_per_nt = 1./100)[0]
+    hit_prob, hit_prefix = ff.likelihood_ratio_tables(example_cp, breaks_to_try, breaks_to_try)[:2]
+    cut = np.nonzero(example_cp > 0)[0]
+    starts, ends = cut[[0, 5, 10]], cut[[3, 200, -1]]
+    s = hit_prefix[ends] - hit_prefix[starts + 1]
+    p_start, p_end = hit_prob[starts], hit_prob[ends]
+    direct = ((1 - s) ** breaks_to_try - (1 - s - p_start) ** breaks_to_try - (1 - s - p_end) ** breaks_to_try
+              + (1 - s - p_start - p_end) ** breaks_to_try)
+    assert np.allclose(ff.fragment_log_probs(starts, ends - starts, hit_prob, hit_prefix, breaks_to_try), np.log(direct))
+
+def test_importance_sampled_tail_matches_direct_simulation():
+    """
+    Test that the weighted FLD from a lower proposal break rate agrees with a direct simulation at the
+    target rate, including the long-fragment tail, and has a smaller variance there.
+    """
+    example_cp = ff.generate_cleav_prob()
+    direct = ff.simulate_fragment_set(example_cp, trials = 2000, break_rate = 100, seed = 0)
+    weighted = ff.simulate_fragment_set(example_cp, trials = 2000, break_rate = 100, proposal_break_rate = 300, seed = 1)
+    direct_fld, direct_var = ff.weighted_fld(direct, max_frag = 1000, bin_lens = 100)
+    weighted_fld, weighted_var = ff.weighted_fld(weighted, max_frag = 1000, bin_lens = 100)
+    assert np.all(np.abs(weighted_fld - direct_fld) < 4 * np.sqrt(weighted_var + direct_var) + 1)
+    # Tail: fragments longer than 500 nt
+    assert np.sum(weighted_var[5:]) < np.sum(direct_var[5:])
+    vplot_arr, vplot_var = ff.weighted_vplot(weighted, max_frag = 300, dist_from_center = 500, bin_lens = 3, bin_locs = 20)
+    assert vplot_arr.shape == vplot_var.shape == (50, 100)
+    assert np.allclose(vplot_arr, weighted.to_vplot(max_frag = 300, dist_from_center = 500, bin_lens = 3, bin_locs = 20))
+
+def test_importance_sampled_tail_is_unbiased():
+    """
+    Test with many trials that the weighted FLD, and a direct simulation, match the exact expected FLD
+    sum_a P(a, a + L) in 200 nt bins out to 1200 nt.
+    """
+    example_cp = ff.generate_cleav_prob()
+    nts = len(example_cp)
+    trials = 50000
+    breaks_to_try = ff.get_breaks_to_try(example_cp, breaks_per_nt = 1./100)[0]
+    hit_prob, hit_prefix = ff.likelihood_ratio_tables(example_cp, breaks_to_try, breaks_to_try)[:2]
+    starts, lens = np.meshgrid(np.arange(nts), np.arange(1, 1200))
+    inside = starts + lens < nts
+    probs = np.exp(ff.fragment_log_probs(starts[inside], lens[inside], hit_prob, hit_prefix, breaks_to_try))
+    expected = trials * np.bincount(lens[inside] // 200, weights = probs, minlength = 6)
+    weighted = ff.simulate_fragment_set(example_cp, trials = trials, break_rate = 100, proposal_break_rate = 300, seed = 3)
+    direct = ff.simulate_fragment_set(example_cp, trials = trials, break_rate = 100, seed = 4)
+    for fs in [weighted, direct]:
+        fld, var = ff.weighted_fld(fs, max_frag = 1200, bin_lens = 200)
+        assert np.all(np.abs(fld - expected) < 4 * np.sqrt(var))
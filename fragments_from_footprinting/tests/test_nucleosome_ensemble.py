@@ -0,0 +1,33 @@
+import sys
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+
+def test_ensemble_cleavage_at_matches_explicit_fibers():
+    """
+    Test that looking up attempts in the shared template gives the same probabilities as building
+    each trial's fiber explicitly with its own occupancy and shifts.
+    """
+    template = ff.generate_cleav_prob(nuc_prob = 0.2)
+    present, shifts = ff.sample_ensemble(5, occupancy = 0.7, fuzziness = 10, seed = 0)
+    nuc_prob_arr = template[ff.link_len:ff.link_len + ff.wrap]
+    locs = np.tile(np.arange(len(template)), (5, 1))
+    probs = ff.ensemble_cleavage_at(template, locs, np.arange(5)[:, None], present, shifts)
+    for trial in range(5):
+        fiber = np.repeat(template[0], len(template))
+        for nuc in np.flatnonzero(present[trial]):
+            start = ff.link_len + nuc * ff.nrl + shifts[trial, nuc]
+            fiber[start:start + ff.wrap] = nuc_prob_arr
+        assert np.array_equal(probs[trial], fiber)
+    assert np.isclose(ff.ensemble_mean_cleavage_prob(template, present), probs.mean())
+
+def test_homogeneous_ensemble_matches_fixed_fiber():
+    """
+    Test that an ensemble with full occupancy and no fuzziness reproduces the fixed fiber simulation.
+    """
+    example_cp = ff.generate_cleav_prob()
+    ensemble = ff.sample_ensemble(20, occupancy = 1.0, fuzziness = 0)
+    fixed = ff.simulate_fragment_set(example_cp, trials = 20, seed = 4)
+    heterogeneous = ff.simulate_fragment_set(example_cp, seed = 4, ensemble = ensemble)
+    assert np.array_equal(fixed.frag_lens, heterogeneous.frag_lens)
+    assert np.array_equal(fixed.midpoints, heterogeneous.midpoints)
@@ -0,0 +1,47 @@
+import sys
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+
+def test_run_sharded_matches_shards_simulated_in_process(tmp_path):
+    """
+    Test that the sharded launcher reduces to the same counts as simulating its shards directly,
+    and that reducing the written shard files gives the same result.
+    """
+    example_cp = ff.generate_cleav_prob()
+    merged = ff.run_sharded(example_cp, trials = 30, num_shards = 3, seed = 7, max_frag = 300, dist_from_center = 500,
+                            bin_locs = 20, out_dir = str(tmp_path))
+    seqs = np.random.SeedSequence(7).spawn(3)
+    expected = ff.reduce_partials([ff.simulate_partial(example_cp, 10, seq, max_frag = 300, dist_from_center = 500, bin_locs = 20)
+                                   for seq in seqs])
+    assert merged["num_trials"] == 30
+    assert np.array_equal(merged["fld"], expected["fld"])
+    assert np.array_equal(merged["vplot"], expected["vplot"])
+    from_files = ff.reduce_partials(sorted(str(p) for p in tmp_path.glob("partial_*.npz")))
+    assert np.array_equal(from_files["vplot"], merged["vplot"])
+
+def test_reduce_partials_rejects_incompatible_partials():
+    """
+    Test that partials from different configurations or repeated seed streams are not summed.
+    """
+    example_cp = ff.generate_cleav_prob()
+    seq = np.random.SeedSequence(1)
+    partial = ff.simulate_partial(example_cp, 5, seq)
+    with pytest.raises(ValueError):
+        ff.reduce_partials([partial, partial])
+    other = ff.simulate_partial(example_cp, 5, seq.spawn(1)[0], break_rate = 2 * ff.break_rate)
+    with pytest.raises(ValueError):
+        ff.reduce_partials([partial, other])
+    # Sets whose fragments differ in ways the cleavage array does not show hash differently
+    plain = ff.make_partial(ff.simulate_fragment_set(example_cp, trials = 5, seed = 2), example_cp, ["a"])
+    shifted = ff.simulate_fragment_set(example_cp, trials = 5, seed = 3)
+    shifted.midpoint += 100
+    windowed = ff.simulate_fragment_set(example_cp, trials = 5, seed = 4, window = ff.vplot_window(len(example_cp)))
+    weighted = ff.simulate_fragment_set(example_cp, trials = 5, seed = 5, proposal_break_rate = 3 * ff.break_rate)
+    with pytest.raises(ValueError):
+        ff.make_partial(weighted, example_cp, ["e"])
+    for other in [ff.make_partial(shifted, example_cp, ["b"]),
+                  ff.make_partial(windowed, example_cp, ["c"], simulation_settings = {"window": ff.vplot_window(len(example_cp))}),
+                  ff.make_partial(weighted, example_cp, ["d"], simulation_settings = {"proposal_break_rate": 3 * ff.break_rate})]:
+        with pytest.raises(ValueError):
+            ff.reduce_partials([plain, other])
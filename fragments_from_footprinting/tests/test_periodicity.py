@@ -0,0 +1,57 @@
+import sys
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+
+def test_estimate_repeat_length_batched():
+    """
+    Test that a batch of synthetic ladders with different periods is recovered in one call.
+    """
+    x = np.arange(1000)
+    periods = np.array([165., 187., 210.])
+    rng = np.random.default_rng(0)
+    flds = np.exp(-x / 400.) * (1 + 0.5 * np.cos(2 * np.pi * x / periods[:, None])) * 1000
+    flds = rng.poisson(flds)
+    repeat_length, peaks, snr = ff.estimate_repeat_length(flds)
+    assert repeat_length.shape == (3,)
+    assert np.all(np.abs(repeat_length - periods) < 3)
+    assert peaks.shape == flds.shape
+    assert np.all(snr > 10)
+
+def test_ladder_peaks_do_not_depend_on_the_batch():
+    """
+    Test that each histogram's ladder peaks use its own repeat length, so a short-period ladder keeps all of its
+    peaks when batched with long-period ones.
+    """
+    x = np.arange(1000)
+    periods = np.array([110., 280., 290.])
+    flds = np.exp(-x / 600.) * (1 + 0.5 * np.cos(2 * np.pi * x / periods[:, None])) * 1000
+    batch_peaks = ff.estimate_repeat_length(flds, max_period = 300)[1]
+    for i in range(len(periods)):
+        assert np.array_equal(batch_peaks[i], ff.estimate_repeat_length(flds[i], max_period = 300)[1])
+    assert np.sum(batch_peaks[0]) >= 7
+
+def test_repeat_length_of_simulated_fld():
+    """
+    Test that the repeat length of a simulated FLD and v-plot matches the nrl used to build the fiber.
+    """
+    example_cp = ff.generate_cleav_prob()
+    fs = ff.simulate_fragment_set(example_cp, trials = 200, seed = 0)
+    repeat_length, peaks, snr = ff.estimate_repeat_length(fs.to_fld())
+    assert abs(repeat_length - ff.nrl) < 0.05 * ff.nrl
+    assert np.min(np.abs(np.flatnonzero(peaks) - ff.nrl)) < 0.1 * ff.nrl
+    vplot_rl = ff.vplot_repeat_length(fs.to_vplot(bin_locs = 10, bin_lens = 10), along = "midpoint", bin_locs = 10)[0]
+    assert vplot_rl.shape == (100,)
+    assert abs(np.nanmedian(vplot_rl) - ff.nrl) < 0.05 * ff.nrl
+
+def test_repeat_length_is_not_a_harmonic():
+    """
+    Test that a period range wide enough to contain twice the repeat length still returns the fundamental,
+    and that the edge of the histogram is not reported as a ladder peak.
+    """
+    example_cp = ff.generate_cleav_prob(linker_length = 53, save_data = 0)
+    fld = ff.simulate_fragment_set(example_cp, trials = 2000, seed = 0).to_fld(max_frag = 1000)
+    repeat_length, peaks, snr = ff.estimate_repeat_length(fld, max_period = 400)
+    assert abs(repeat_length - 200) < 15
+    assert not peaks[0]
+    assert np.all(np.abs(np.diff(np.flatnonzero(peaks)) - 200) < 30)
@@ -0,0 +1,44 @@
+import sys
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+
+def _original_dyad_array(dyad_prob, nuc_prob, wrap, dyad_width):
+    # make_dyad_array before the profile library
+    gradient = np.linspace(0, dyad_prob-nuc_prob, int(1+np.round(dyad_width/2)))[1:]
+    zeros_to_add = np.zeros(int((wrap-2*len(gradient)+1)/2))
+    return np.repeat(nuc_prob, wrap) + np.concatenate((zeros_to_add,gradient,np.flip(gradient)[1:],zeros_to_add))
+
+@pytest.mark.parametrize("wrap_bp", [147, 146])
+def test_dyad_profiles(wrap_bp):
+    """
+    Test that dyad profiles have length wrap_bp for odd and even widths, match the original
+    make_dyad_array exactly for an odd wrap, and that batched and memoized profiles agree.
+    """
+    nuc_probs = np.array([0.0, 0.1, 0.3])
+    widths = np.array([[14], [15]])
+    batch = ff.nucleosome_profiles("dyad", nuc_prob = nuc_probs, peak_prob = 0.9, dyad_width = widths, wrap_bp = wrap_bp)
+    assert batch.shape == (2, 3, wrap_bp)
+    for i, width in enumerate(widths[:, 0]):
+        for j, nuc_prob in enumerate(nuc_probs):
+            single = ff.make_dyad_array(dyad_prob = 0.9, nuc_prob = nuc_prob, wrap_bp = wrap_bp, dyad_width = width)
+            assert np.array_equal(batch[i, j], single)
+            assert single.max() == pytest.approx(0.9)
+            if wrap_bp % 2 == 1:
+                assert np.array_equal(single, _original_dyad_array(0.9, nuc_prob, wrap_bp, width))
+    assert len(ff.generate_cleav_prob(nuc_prob = 0.1, wrap_bp = wrap_bp, dyad_bool = 1, num_nucs = 2, save_data = 0)) == 2 * wrap_bp + 3 * ff.link_len
+
+def test_profile_shapes_are_memoized():
+    """
+    Test the other shapes and that repeated requests are served from the read-only cache.
+    """
+    ff.nucleosome_profile.cache_clear()
+    profile = ff.nucleosome_profile("gaussian", nuc_prob = 0.1, peak_prob = 0.5, sigma = 5.)
+    assert profile is ff.nucleosome_profile("gaussian", nuc_prob = 0.1, peak_prob = 0.5, sigma = 5.)
+    assert ff.nucleosome_profile.cache_info().hits == 1
+    assert not profile.flags.writeable
+    assert profile[ff.wrap // 2] == pytest.approx(0.5) and profile[0] == pytest.approx(0.1)
+    sasa = ff.nucleosome_profiles("sasa", nuc_prob = [0., 0.2], peak_prob = 1.)
+    assert sasa.shape == (2, ff.wrap) and np.isclose(sasa.max(), 1.) and np.all(sasa[1] >= 0.2)
+    template = np.linspace(0, 1, ff.wrap)
+    assert np.allclose(ff.nucleosome_profiles("custom", nuc_prob = 0.2, peak_prob = 0.6, template = template), 0.2 + 0.4 * template)
@@ -0,0 +1,52 @@
+import sys
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+
+def test_metrics_match_reference_values():
+    """
+    Test the vectorized metrics against per-histogram reference computations, including rebinning.
+    """
+    stats = pytest.importorskip("scipy.stats")
+    rng = np.random.default_rng(0)
+    observed = rng.random(60)
+    simulated = rng.random((4, 20))
+    coarse = ff.rebin(observed, (20,))
+    assert np.allclose(coarse, observed.reshape(20, 3).sum(axis=1))
+    # Bins left over after coarsening would misalign the histograms
+    with pytest.raises(ValueError):
+        ff.rebin(observed, (7,))
+    with pytest.raises(ValueError):
+        ff.correlation(observed, rng.random((4, 25)))
+    p = coarse / coarse.sum()
+    for i, sim in enumerate(simulated):
+        q = sim / sim.sum()
+        m = 0.5 * (p + q)
+        assert np.isclose(ff.correlation(observed, simulated)[i], np.corrcoef(p, q)[0, 1])
+        assert np.isclose(ff.kl_divergence(observed, simulated, eps = 0)[i], stats.entropy(p, q))
+        assert np.isclose(ff.js_divergence(observed, simulated)[i], 0.5 * stats.entropy(p, m) + 0.5 * stats.entropy(q, m))
+        assert np.isclose(ff.emd_1d(observed, simulated)[i], stats.wasserstein_distance(np.arange(20) * 3, np.arange(20) * 3, p, q))
+    # Sliced EMD is zero for identical v-plots and positive for one shifted by a length bin
+    vplot = rng.random((8, 30))
+    shifted = np.zeros_like(vplot)
+    shifted[:, 1:] = vplot[:, :-1]
+    assert ff.emd_2d(vplot, np.stack([vplot, shifted]), bin_widths = (10, 1))[0] == pytest.approx(0)
+    assert ff.emd_2d(vplot, np.stack([vplot, shifted]), bin_widths = (10, 1))[1] > 0
+
+def test_rank_sweep_finds_the_generating_configuration():
+    """
+    Test that a sweep simulated at a coarser binning ranks the configuration that generated the observation first.
+    """
+    nuc_probs = [0.0, 0.1, 0.3]
+    observed_set = ff.simulate_fragment_set(ff.generate_cleav_prob(nuc_prob = 0.1, save_data = 0), trials = 1000, seed = 1)
+    sweep = [ff.simulate_fragment_set(ff.generate_cleav_prob(nuc_prob = p, save_data = 0), trials = 1000, seed = 2) for p in nuc_probs]
+    observed_fld = observed_set.to_fld(max_frag = 600)
+    simulated_flds = np.stack([fs.to_fld(max_frag = 600, bin_lens = 5) for fs in sweep])
+    for metric in ("correlation", "kl", "js", "emd"):
+        ranking, scores = ff.rank_sweep(observed_fld, simulated_flds, metric)
+        assert ranking[0] == 1
+        assert scores.shape == (3,)
+    observed_vplot = observed_set.to_vplot(max_frag = 300, dist_from_center = 500, bin_locs = 20)
+    simulated_vplots = np.stack([fs.to_vplot(max_frag = 300, dist_from_center = 500, bin_lens = 10, bin_locs = 20) for fs in sweep])
+    ranking, scores = ff.rank_sweep(observed_vplot, simulated_vplots, "emd", bin_widths = (20, 1))
+    assert ranking[0] == 1
@@ -0,0 +1,56 @@
+import sys
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+from concurrent.futures import ThreadPoolExecutor
+
+@pytest.fixture(scope="module")
+def server():
+    server = ff.start_server(port = 0, max_workers = 2, cache_size = 2)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_server_matches_direct_simulation_and_caches(server):
+    """
+    Test that the server returns the same arrays as simulating in process, and serves repeats from its cache.
+    """
+    port = server.server_address[1]
+    config = {"nuc_prob": 0.1, "trials": 20, "seed": 3, "max_frag": 300, "dist_from_center": 500, "bin_locs": 20}
+    result = ff.request_simulation(config, port = port)
+    example_cp = ff.generate_cleav_prob(nuc_prob = 0.1, save_data = 0)
+    fragment_set = ff.simulate_fragment_set(example_cp, trials = 20, seed = 3)
+    assert np.array_equal(result["fld"], fragment_set.to_fld(300))
+    assert np.array_equal(result["vplot"], fragment_set.to_vplot(300, 500, 1, 20))
+    hits = server.service.stats["hits"]
+    repeat = ff.request_simulation(config, port = port)
+    assert server.service.stats["hits"] == hits + 1
+    assert np.array_equal(repeat["vplot"], result["vplot"])
+    with pytest.raises(ValueError):
+        ff.request_simulation({"trials": 20}, port = port)
+
+def test_identical_requests_are_coalesced(server):
+    """
+    Test that concurrent identical requests run a single simulation, and that the cache stays bounded.
+    """
+    simulated = server.service.stats["simulated"]
+    config = {"trials": 200, "seed": 11}
+    with ThreadPoolExecutor(max_workers = 4) as pool:
+        results = list(pool.map(lambda _: ff.request_simulation(config, port = server.server_address[1]), range(4)))
+    assert server.service.stats["simulated"] == simulated + 1
+    assert all(np.array_equal(r["fld"], results[0]["fld"]) for r in results)
+    for seed in range(3):
+        ff.request_simulation({"trials": 1, "seed": seed}, port = server.server_address[1])
+    assert len(server.service.cache) <= 2
+
+def test_every_worker_is_warm_and_failures_return_500(server, monkeypatch):
+    """
+    Test that the service warms all of its workers, and that an unexpected error in a request is reported as a
+    server error rather than dropping the connection.
+    """
+    assert len(server.service.worker_pids) == 2
+    def broken(config):
+        raise RuntimeError("worker died")
+    monkeypatch.setattr(server.service, "submit", broken)
+    with pytest.raises(RuntimeError, match="worker died"):
+        ff.request_simulation({"trials": 1, "seed": 0}, port = server.server_address[1])
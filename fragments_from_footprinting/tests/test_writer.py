@@ -0,0 +1,77 @@
+import sys
+import os
+import time
+import threading
+import pytest
+import numpy as np
+import fragments_from_footprinting as ff
+
+def test_pipeline_with_writer(tmp_path, monkeypatch):
+    """
+    Test that the pipeline functions write the same files in the background as they do synchronously.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("intermed_data")
+    with ff.AsyncWriter(max_pending = 2) as writer:
+        example_cp = ff.generate_cleav_prob(nuc_prob = 0.1, writer = writer)
+        frags, mids = ff.get_fld(example_cp, trials = 2, writer = writer)
+        df = ff.frag_mid_df(frags, mids, writer = writer)
+        vplot_arr = ff.vplot_data(df, writer = writer)
+        vplot_norm = ff.process_vplot_data(vplot_arr, writer = writer)
+    assert np.array_equal(np.load("intermed_data/cleavage_prob.npy"), example_cp)
+    assert np.array_equal(np.load("intermed_data/frag_lens.npy"), frags)
+    assert np.array_equal(np.load("intermed_data/vplot_arr.npy"), vplot_arr)
+    assert np.array_equal(np.load("intermed_data/vplot_norm.npy"), vplot_norm)
+    assert os.path.exists("intermed_data/fragment_lens_and_locations.csv")
+
+def test_fragment_set_functions_with_writer(tmp_path, monkeypatch):
+    """
+    Test that the FragmentSet, footprint and partial functions that save intermediate data also write through the writer.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("intermed_data")
+    example_cp = ff.generate_cleav_prob(save_data = 0)
+    starts, ends = ff.nucleosome_intervals()
+    with ff.AsyncWriter(max_pending = 2) as writer:
+        composed = ff.compose_footprints(len(example_cp), starts, ends, profiles = [1.], save_data = 1, writer = writer)
+        fs = ff.simulate_fragment_set(example_cp, trials = 5, seed = 0, save_data = 1, writer = writer)
+        vplot_arr = fs.to_vplot(save_data = 1, writer = writer)
+    assert np.array_equal(np.load("intermed_data/cleavage_prob.npy"), composed)
+    assert np.array_equal(ff.FragmentSet.load().frag_lens, fs.frag_lens)
+    assert np.array_equal(np.load("intermed_data/vplot_arr.npy"), vplot_arr)
+    partial = ff.simulate_partial(example_cp, 5, np.random.SeedSequence(0))
+    with ff.AsyncWriter() as writer:
+        ff.save_partial(partial, "partial.npz", writer)
+        writer.flush()
+        merged = ff.reduce_partials(["partial.npz"], save_data = 1, writer = writer)
+    assert np.array_equal(np.load("intermed_data/fld_counts.npy"), merged["fld"])
+    assert np.array_equal(np.load("intermed_data/vplot_arr.npy"), partial["vplot"])
+
+def test_backpressure_and_errors():
+    """
+    Test that a full writer blocks the caller and that a failed write is raised at flush and skips later writes.
+    """
+    release = threading.Event()
+    done = []
+    writer = ff.AsyncWriter(max_pending = 1)
+    writer.submit(release.wait)
+    writer.submit(done.append, 1)
+    blocked = threading.Thread(target = writer.submit, args = (done.append, 2))
+    blocked.start()
+    time.sleep(0.1)
+    assert blocked.is_alive()
+    release.set()
+    blocked.join(timeout = 5)
+    writer.flush()
+    assert done == [1, 2]
+
+    def fail():
+        raise OSError("disk full")
+    writer.submit(fail)
+    writer.submit(done.append, 3)
+    with pytest.raises(OSError):
+        writer.flush()
+    assert done == [1, 2]
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(done.append, 4)
@@ -0,0 +1,141 @@
+"""
+Background writer that saves intermediate data while the simulation keeps running.
+
+Functions that take a `writer` argument hand their arrays and dataframes to it instead of
+blocking on `np.save` / `to_csv`. The writer holds at most `max_pending` writes; when it is full
+the caller waits (backpressure), so a slow filesystem can never make the queue grow without bound.
+An error in a write is raised again in the caller on its next submission, `flush` or `close`.
+
+    with AsyncWriter() as writer:
+        for nuc_prob in nuc_probs:
+            cleavage_prob = generate_cleav_prob(nuc_prob = nuc_prob, writer = writer)
+            ...
+    # every file is on disk here
+
+Arrays handed to the writer must not be modified until they have been written.
+"""
+import queue
+import threading
+import numpy as np
+
+
+class AsyncWriter:
+    """
+    Bounded queue of writes executed in order by a single background thread.
+
+    Parameters
+    ----------
+    max_pending : int
+        Maximum number of writes waiting to be executed before `submit` blocks.
+    """
+
+    def __init__(self, max_pending: int = 8):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="AsyncWriter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                if self._error is None:
+                    func, args, kwargs = task
+                    func(*args, **kwargs)
+            except BaseException as err:
+                self._error = err
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue `func(*args, **kwargs)`, blocking while `max_pending` writes are already waiting.
+
+        Once a write has failed, the writes queued after it are skipped and the error is raised here or by `flush`.
+        """
+        if self._closed:
+            raise RuntimeError("AsyncWriter is closed")
+        self._raise_error()
+        self._queue.put((func, args, kwargs))
+
+    def save(self, path: str, array: np.ndarray):
+        """
+        Queue `np.save(path, array)`.
+        """
+        self.submit(np.save, path, array)
+
+    def to_csv(self, df, path: str, **kwargs):
+        """
+        Queue `df.to_csv(path, **kwargs)`.
+        """
+        self.submit(df.to_csv, path, **kwargs)
+
+    def flush(self):
+        """
+        Wait until every queued write has finished, and raise the first error of a failed write.
+        """
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """
+        Flush and stop the background thread. Safe to call more than once.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Do not mask the exception raised in the with-block with a write error
+            try:
+                self.close()
+            except Exception:
+                pass
+        return False
+
+
+def save_array(path: str, array: np.ndarray, writer: AsyncWriter = None):
+    """
+    `np.save` the array, in the background if a writer is given.
+    """
+    if writer is None:
+        np.save(path, array)
+    else:
+        writer.save(path, array)
+
+
+def save_npz(path: str, writer: AsyncWriter = None, **arrays):
+    """
+    `np.savez_compressed` the arrays, in the background if a writer is given.
+    """
+    if writer is None:
+        np.savez_compressed(path, **arrays)
+    else:
+        writer.submit(np.savez_compressed, path, **arrays)
+
+
+def save_csv(df, path: str, writer: AsyncWriter = None):
+    """
+    Write the dataframe to a .csv file, in the background if a writer is given.
+    """
+    if writer is None:
+        df.to_csv(path)
+    else:
+        writer.to_csv(df, path)